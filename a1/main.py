@@ -11,6 +11,14 @@
 # Note that images, when loaded, are converted to the YCbCr
 # colourspace, and that you should manipulate only the Y component of
 # each pixel when doing intensity changes.
+#
+# The operations can also be applied without a display, to every
+# image in a directory, with
+#
+#   python main.py batch {input dir} {output dir} [options]
+#
+# Run 'python main.py batch -h' for the options.  PyOpenGL is not
+# needed in that case.
 
 import sys, os, numpy, math
 
@@ -20,14 +28,6 @@ except:
   print 'Error: Pillow has not been installed.'
   sys.exit(0)
 
-try: # PyOpenGL
-  from OpenGL.GLUT import *
-  from OpenGL.GL import *
-  from OpenGL.GLU import *
-except:
-  print 'Error: PyOpenGL has not been installed.'
-  sys.exit(0)
-
 
 
 # Globals
@@ -37,24 +37,86 @@ windowHeight =  800
 
 localHistoRadius = 5  # distance within which to apply local histogram equalization
 
+histoEqMode = 'sliding'  # 'sliding' window histograms, or 'integral' histograms (reused across radii)
 
+histoEqJobs = 1  # number of processes among which 'sliding' equalization is split
 
-# Current image
+integralHistoBins   = 256               # maximum number of bins in the integral histogram
+integralHistoMemory = 512 * 1024 * 1024 # memory budget (bytes) for the integral histogram; fewer bins are used to fit
 
-imgDir      = 'images'
-imgFilename = 'mandrill.png'
 
-currentImage = Image.open( os.path.join( imgDir, imgFilename ) ).convert( 'YCbCr' ).transpose( Image.FLIP_TOP_BOTTOM )
-tempImage    = None
 
+# An image stored as separate Y, Cb and Cr components, each a
+# contiguous (height,width) uint8 array.  Operations read and write
+# these arrays directly; conversion to and from PIL happens only when
+# loading, saving and displaying.
+#
+# 'changed' is set whenever the pixels are modified, so that display()
+# knows to rebuild its RGB pixels.
+
+class YCbCrImage( object ):
+
+  def __init__( self, width, height ):
+
+    self.Y  = numpy.zeros( (height,width), numpy.uint8 )
+    self.Cb = numpy.zeros( (height,width), numpy.uint8 )
+    self.Cr = numpy.zeros( (height,width), numpy.uint8 )
+
+    self.changed = True
+
+  @property
+  def size( self ):
+    return (self.Y.shape[1], self.Y.shape[0])
+
+  def components( self ):
+    return (self.Y, self.Cb, self.Cr)
+
+  # Build from a PIL image
+
+  @staticmethod
+  def fromPIL( img ):
+
+    Y, Cb, Cr = img.convert( 'YCbCr' ).split()
+
+    result = YCbCrImage( img.size[0], img.size[1] )
+    result.Y[...]  = numpy.asarray( Y )
+    result.Cb[...] = numpy.asarray( Cb )
+    result.Cr[...] = numpy.asarray( Cr )
 
+    return result
 
-# File dialog (doesn't work on Mac OSX)
+  # Convert to a PIL image in YCbCr mode
 
-if sys.platform != 'darwin':
-  import Tkinter, tkFileDialog
-  root = Tkinter.Tk()
-  root.withdraw()
+  def toPIL( self ):
+
+    return Image.merge( 'YCbCr', [ Image.fromarray( c ) for c in self.components() ] )
+
+  # Copy the pixels of 'other' into this image, reusing this image's
+  # arrays if they are the right size.  With step > 1, only every
+  # step'th row and column is copied, giving a subsampled image.
+
+  def copyFrom( self, other, step = 1 ):
+
+    width  = (other.size[0] + step-1) / step
+    height = (other.size[1] + step-1) / step
+
+    if self.size != (width,height):
+      self.__init__( width, height )
+
+    for dst, src in zip( self.components(), other.components() ):
+      numpy.copyto( dst, src[::step,::step] )
+
+    self.changed = True
+
+
+
+# Current image
+
+imgDir      = 'images'
+imgFilename = 'mandrill.png'
+
+currentImage = None # loaded at startup (see the end of this file)
+tempImage    = None
 
 
 
@@ -67,126 +129,522 @@ if sys.platform != 'darwin':
 
 def applyBrightnessAndContrast( brightness, contrast ):
 
-  width  = currentImage.size[0]
-  height = currentImage.size[1]
+  adjustBrightnessAndContrast( tempImage, currentImage, brightness, contrast )
 
-  srcPixels = tempImage.load()
-  dstPixels = currentImage.load()
-  
-  for w in range(width): 				#increment through width of image
-	for h in range (height): 			#increment through height of image
-		
-	  dstPixels[w,h] = ((contrast*srcPixels[w,h][0])+brightness, srcPixels[w,h][1], srcPixels[w,h][2])
-	  
   print 'adjust brightness = %f, contrast = %f' % (brightness,contrast)
 
+
+
+# Apply brightness and contrast to the image 'src' and store the
+# result in 'dst', which must be the same size.
+
+def adjustBrightnessAndContrast( src, dst, brightness, contrast ):
+
+  # Every pixel with the same intensity maps to the same new
+  # intensity, so build a 256-entry lookup table once for this
+  # (brightness, contrast) pair, clamped to [0,255].
+
+  lut = numpy.clip( contrast * numpy.arange( 256 ) + brightness, 0, 255 ).astype( numpy.uint8 )
+
+  # Apply the table to the Y component only, in a single pass, and
+  # leave Cb and Cr untouched.
+
+  numpy.take( lut, src.Y, out=dst.Y )
+
+  numpy.copyto( dst.Cb, src.Cb )
+  numpy.copyto( dst.Cr, src.Cr )
+
+  dst.changed = True
+
   
 
 # Perform local histogram equalization on the current image using the given radius.
 
 def performHistoEqualization( radius ):
 
-  pixels = currentImage.load()
-  width  = currentImage.size[0]
-  height = currentImage.size[1]
-  
-  equalized = [[0 for x in range(width)] for y in range(height)] # Temporary array to store new intensity values     
-  
-  for w in range(width):
-    for h in range(height):
-      
-      # Get intensity of current pixel
-      r = pixels[w,h]
-      r = r[0] 
-      
-      # Acts as pseudo-histogram to store surrounding pixel intensities. This is done to avoid having 256 empty buckets
-      # that then need to be emptied each time
-      box = [] 
-      
-      # Calculate size of area covered by radius 
-      N = numpy.power((radius * 2) + 1, 2) 
-      
-      #Iterate through area covered by radius around target pixel
-      for j in range(w - radius , w + radius + 1):
-        for k in range(h - radius , h + radius + 1):
-	  
-	  # Ensure in bounds and add to list.
-          if j < width and j >= 0 and k < height and k >= 0: 
-            p = pixels[j,k]
-            box.append(p[0])
-	  # If sourcing from out of bounds, that means we're at a corner
-	  # or edge pixel, so we ignore and shrink N value for calculation
-	  else:
-	    N = N - 1
-      
-      theSum = 0
-      for i in range(r + 1): # For each intensity...
-        cc = box.count(i) # ...count the occurences of the intensity...
-        theSum = theSum + cc # ...and add it to the sum
-      
-      # Calculate new pixel intensity and store in temporary list
-      s = ((256/N) * theSum) - 1
-      equalized[h][w] = s
-
-  #Copy new intensities to current image
-  for w in range(width):
-    for h in range(height):
-      eq = list(pixels[w,h])
-      eq[0] = equalized[h][w]
-      eq = tuple(eq)
-      pixels[w,h] = eq      
+  pixels = currentImage.Y # Y component as a (height,width) array of intensities
+
+  if histoEqMode == 'integral':
+    equalized = equalizeIntegral( pixels, radius )
+  elif histoEqJobs > 1:
+    equalized = equalizeParallel( pixels, radius, histoEqJobs )
+  else:
+    equalized = equalizeRows( pixels, radius, 0, pixels.shape[0] )
+
+  # The equalization reads rows on either side of the row being
+  # equalized, so the result is only copied back once it is complete
+
+  numpy.copyto( currentImage.Y, equalized )
+
+  currentImage.changed = True
+
   print 'perform local histogram equalization with radius %d' % radius
 
 
 
+# Locally equalize rows [first,last) of the 2D intensity array
+# 'pixels' and return them as a (last-first,width) uint8 array.
+#
+# The window around each pixel is swept down the image one row at a
+# time.  For each column we keep a histogram of the intensities in the
+# rows currently covered by the window, so moving to the next row only
+# adds one row and removes one row of pixels.  The histogram of the
+# window around each pixel is then the sum of the column histograms
+# within 'radius' columns of it, which is found for all pixels in the
+# row at once from running sums across the columns.
+#
+# Near the edges of the image the window is clipped, and N shrinks to
+# the number of pixels actually inside it.
+
+def equalizeRows( pixels, radius, first, last ):
+
+  height = pixels.shape[0]
+  width  = pixels.shape[1]
+
+  columns = numpy.arange( width )
+
+  # Range of columns [left,right] covered by the window around each column
+
+  left  = numpy.maximum( columns - radius, 0 )
+  right = numpy.minimum( columns + radius, width-1 )
+
+  numCols = right - left + 1
+
+  # Column histograms: colHisto[i,x] is the number of pixels of
+  # intensity i in column x within the rows of the current window.
+  # Start with the window around row 'first'-1, which the top of the
+  # loop slides to row 'first'.
+
+  colHisto = numpy.zeros( (256,width), numpy.int32 )
+
+  for k in range( max( first-radius-1, 0 ), min( first+radius, height ) ):
+    colHisto[ pixels[k], columns ] += 1
+
+  runningSum = numpy.zeros( (256,width+1), numpy.int32 )
+
+  equalized = numpy.empty( (last-first,width), numpy.uint8 )
+
+  for h in range( first, last ):
+
+    # Slide the window down by one row
+
+    if h+radius < height:
+      colHisto[ pixels[h+radius], columns ] += 1
+
+    if h-radius-1 >= 0:
+      colHisto[ pixels[h-radius-1], columns ] -= 1
+
+    # Window histograms for every pixel in the row, then the number
+    # of pixels in each window with intensity <= that of the pixel
+
+    numpy.cumsum( colHisto, axis=1, out=runningSum[:,1:] )
+
+    windowHisto = runningSum[:,right+1] - runningSum[:,left]
+
+    theSum = numpy.cumsum( windowHisto, axis=0 )[ pixels[h], columns ]
+
+    # Size of the (possibly clipped) window
+
+    numRows = min( h+radius, height-1 ) - max( h-radius, 0 ) + 1
+
+    N = numRows * numCols
+
+    # New intensity, clamped to [0,255] as when stored in the image
+
+    s = 256.0 * theSum / N - 1
+
+    equalized[h-first] = numpy.clip( s, 0, 255 )
+
+  return equalized
+
+
+
+# Locally equalize the 2D intensity array 'pixels' using 'jobs'
+# processes and return the result as a uint8 array.
+#
+# The rows are split into bands, each of which is equalized by
+# equalizeRows() in a worker process.  The workers read the whole
+# image from shared memory, so each band sees the 'radius' rows above
+# and below it, and write their rows into a shared result.  The result
+# is identical to equalizing the whole image at once.
+
+def equalizeParallel( pixels, radius, jobs ):
+
+  import multiprocessing
+
+  height = pixels.shape[0]
+  width  = pixels.shape[1]
+
+  sharedPixels    = multiprocessing.RawArray( 'B', height*width )
+  sharedEqualized = multiprocessing.RawArray( 'B', height*width )
+
+  numpy.frombuffer( sharedPixels, numpy.uint8 ).reshape( (height,width) )[...] = pixels
+
+  # A few bands per process, so that processes finishing early can take another
+
+  numBands = min( 4 * jobs, height )
+  bounds   = [ (height * i) / numBands for i in range( numBands+1 ) ]
+  bands    = [ (bounds[i], bounds[i+1], radius) for i in range( numBands ) ]
+
+  pool = multiprocessing.Pool( jobs, initializer=initEqualizeWorker, initargs=(sharedPixels, sharedEqualized, height, width) )
+  pool.map( equalizeBand, bands )
+  pool.close()
+  pool.join()
+
+  return numpy.frombuffer( sharedEqualized, numpy.uint8 ).reshape( (height,width) ).copy()
+
+
+
+# Shared image and result, as seen by an equalizeParallel() worker
+
+workerPixels    = None
+workerEqualized = None
+
+def initEqualizeWorker( sharedPixels, sharedEqualized, height, width ):
+
+  global workerPixels, workerEqualized
+
+  workerPixels    = numpy.frombuffer( sharedPixels,    numpy.uint8 ).reshape( (height,width) )
+  workerEqualized = numpy.frombuffer( sharedEqualized, numpy.uint8 ).reshape( (height,width) )
+
+
+
+# Equalize one band of rows, given as (first, last, radius), in a worker
+
+def equalizeBand( band ):
+
+  first, last, radius = band
+
+  workerEqualized[first:last] = equalizeRows( workerPixels, radius, first, last )
+
+
+
+# Integral histogram of the last image equalized in 'integral' mode:
+# (source pixels, equalized pixels, number of bins, tables).  It can
+# take up to 'integralHistoMemory', so it is dropped when another
+# image is loaded or the mode is switched.
+
+integralHisto = None
+
+
+
+# Locally equalize the 2D intensity array 'pixels' using an integral
+# histogram and return the result as a uint8 array.
+#
+# tables[b] is a summed-area table of the pixels with bin <= b, so the
+# number of pixels in any rectangle with bin <= b takes four lookups,
+# regardless of the radius.  The tables are built once per image.  If
+# 'pixels' is the result of the previous equalization (i.e. 'h' is
+# pressed again, perhaps after changing the radius with +/-), the
+# image from before that equalization is equalized again with the new
+# radius, reusing its tables.
+#
+# The tables take bins*(height+1)*(width+1)*4 bytes, so the number of
+# bins is halved until they fit in 'integralHistoMemory'.  With fewer
+# than 256 bins, each pixel is counted against the top of its bin.
+
+def equalizeIntegral( pixels, radius ):
+
+  global integralHisto
+
+  if integralHisto is not None and numpy.array_equal( pixels, integralHisto[1] ):
+    pixels, bins, tables = integralHisto[0], integralHisto[2], integralHisto[3]
+  else:
+    pixels = pixels.copy() # kept with the tables, so must not change with the image
+    bins, tables = buildIntegralHisto( pixels )
+
+  height = pixels.shape[0]
+  width  = pixels.shape[1]
+
+  binned = (pixels.astype( numpy.intp ) * bins) >> 8 # bin of each pixel
+
+  # Window bounds [top,bottom) and [left,right) around each row and column
+
+  rows    = numpy.arange( height )
+  top     = numpy.maximum( rows - radius, 0 )[:,None]
+  bottom  = numpy.minimum( rows + radius + 1, height )[:,None]
+
+  columns = numpy.arange( width )
+  left    = numpy.maximum( columns - radius, 0 )[None,:]
+  right   = numpy.minimum( columns + radius + 1, width )[None,:]
+
+  # Number of pixels in each window with bin <= that of the pixel
+
+  theSum = (tables[binned,bottom,right] - tables[binned,top,right]
+            - tables[binned,bottom,left] + tables[binned,top,left])
+
+  N = (bottom - top) * (right - left)
+
+  s = 256.0 * theSum / N - 1
+
+  equalized = numpy.clip( s, 0, 255 ).astype( numpy.uint8 )
+
+  integralHisto = (pixels, equalized, bins, tables)
+
+  return equalized
+
+
+
+# Build the integral histogram tables of 'pixels' and return (bins, tables)
+
+def buildIntegralHisto( pixels ):
+
+  height = pixels.shape[0]
+  width  = pixels.shape[1]
+
+  bins = integralHistoBins
+  while bins > 1 and bins * (height+1) * (width+1) * 4 > integralHistoMemory:
+    bins = bins / 2
+
+  binned = (pixels.astype( numpy.intp ) * bins) >> 8
+
+  tables = numpy.zeros( (bins,height+1,width+1), numpy.int32 )
+
+  for b in range( bins ):
+    numpy.cumsum( numpy.cumsum( binned <= b, axis=0, dtype=numpy.int32 ), axis=1, out=tables[b,1:,1:] )
+
+  print 'built integral histogram with %d bins' % bins
+
+  return bins, tables
+
+
+
 # Scale the tempImage by the given factor and store it in
 # currentImage.  Use backward projection.  This is called when the
 # mouse is moved with the right button held down.
 
 def scaleImage( factor ):
 
+  scale( tempImage, currentImage, factor, scaleMode )
+
+  print 'scale image by %f' % factor
+
+
+
+# Interpolation used when scaling: 'nearest', 'bilinear', 'bicubic' or 'lanczos3'
+
+scaleModes = [ 'nearest', 'bilinear', 'bicubic', 'lanczos3' ]
+
+scaleMode = 'nearest'
+
+
+
+# Scale the image 'src' by 'factor' about its centre, using the given
+# interpolation mode, and store the result in 'dst', which must be the
+# same size.
+#
+# Interpolation is separable, so the image is filtered along its rows
+# and then along its columns, each with a table of per-column (or
+# per-row) source indices and weights.  Nearest neighbour has a single
+# tap per axis and is done as a gather of rows, then of columns.
+#
+# Intermediate results go into buffers that are kept between calls,
+# so nothing of the image's size is allocated for each motion event.
+
+def scale( src, dst, factor, mode ):
+
+  width  = src.size[0]
+  height = src.size[1]
+
+  # Quantize the factor so that nearby motion events share the same
+  # index maps and weights, which are cached between calls
+
+  quantized = round( factor, scaleQuantum )
+
+  key = (width, height, quantized, mode)
+
+  if key not in scaleMaps:
+    if len(scaleMaps) >= maxScaleMaps:
+      scaleMaps.clear()
+    xs, xWeights, xOutside = scaleWeights( width,  quantized, mode )
+    ys, yWeights, yOutside = scaleWeights( height, quantized, mode )
+    scaleMaps[key] = (xs, xWeights, xOutside, ys, yWeights, yOutside)
+
+  xs, xWeights, xOutside, ys, yWeights, yOutside = scaleMaps[key]
+
+  background = (255,128,128) # white, for pixels that come from outside the image
+
+  if mode == 'nearest':
+
+    rows = scratchBuffer( 'rows', (height,width), numpy.uint8 )
+
+    for srcPixels, dstPixels, bg in zip( src.components(), dst.components(), background ):
+
+      # Gather the source rows of every destination row, then the
+      # source columns of every destination column
+
+      numpy.take( srcPixels, ys[:,0], axis=0, out=rows )
+      numpy.take( rows, xs[:,0], axis=1, out=dstPixels )
+
+      dstPixels[yOutside,:] = bg # rows and columns whose source is outside the image
+      dstPixels[:,xOutside] = bg
+
+  else:
+
+    gather  = scratchBuffer( 'rows',    (height,width), numpy.uint8 )
+    tap     = scratchBuffer( 'tap',     (height,width), numpy.float32 )
+    rowPass = scratchBuffer( 'rowPass', (height,width), numpy.float32 )
+    colPass = scratchBuffer( 'colPass', (height,width), numpy.float32 )
+
+    for srcPixels, dstPixels, bg in zip( src.components(), dst.components(), background ):
+
+      # Filter along the rows, then along the columns.  Each tap's
+      # source pixels are gathered into a buffer rather than by
+      # indexing, which would make a new array.
+
+      rowPass.fill( 0 )
+      for k in range( xs.shape[1] ):
+        numpy.take( srcPixels, xs[:,k], axis=1, out=gather )
+        numpy.multiply( gather, xWeights[None,:,k], out=tap )
+        rowPass += tap
+
+      colPass.fill( 0.5 ) # so that the conversion to uint8 rounds
+      for k in range( ys.shape[1] ):
+        numpy.take( rowPass, ys[:,k], axis=0, out=tap )
+        tap *= yWeights[:,k,None]
+        colPass += tap
+
+      numpy.clip( colPass, 0, 255, out=colPass )
+      numpy.copyto( dstPixels, colPass, casting='unsafe' )
+
+      dstPixels[yOutside,:] = bg # rows and columns whose source is outside the image
+      dstPixels[:,xOutside] = bg
+
+  dst.changed = True
+
+
+
+# Index maps and weights for scale(), keyed by (width, height, quantized factor, mode)
+
+scaleMaps = {}
+
+
+
+# Working arrays, kept between calls and reallocated only when the
+# requested shape or type changes
+
+scratchBuffers = {}
+
+def scratchBuffer( name, shape, dtype ):
+
+  buf = scratchBuffers.get( name )
+
+  if buf is None or buf.shape != shape or buf.dtype != dtype:
+    buf = numpy.empty( shape, dtype )
+    scratchBuffers[name] = buf
+
+  return buf
+
+maxScaleMaps = 64  # number of cached index maps
+scaleQuantum = 3   # decimal places to which the scale factor is rounded
+
+
+
+# Backward projection along one axis of length 'size': for each
+# destination position x' (relative to the centre), the source
+# position is round(x'/factor).  Returns the source index of each
+# destination index and a boolean array marking those whose source
+# is outside the image (their index is set to 0).
+
+def scaleMap( size, factor ):
+
+  dst = numpy.arange( size ) - size/2
+
+  src = dst / float(factor)
+  src = numpy.sign( src ) * numpy.floor( numpy.abs( src ) + 0.5 ) # round half away from zero, like round()
+  src = src.astype( numpy.intp ) + size/2
+
+  outside = (src < 0) | (src >= size)
+  src[outside] = 0
+
+  return src, outside
+
+
+
+# Interpolation kernels and their radii
+
+def bilinearKernel( t ):
+  return numpy.maximum( 1 - numpy.abs( t ), 0 )
+
+def bicubicKernel( t ): # Keys cubic with a = -0.5
+  t = numpy.abs( t )
+  return numpy.where( t < 1, (1.5*t - 2.5)*t*t + 1,
+                      numpy.where( t < 2, ((-0.5*t + 2.5)*t - 4)*t + 2, 0 ) )
+
+def lanczos3Kernel( t ):
+  return numpy.where( numpy.abs( t ) < 3, numpy.sinc( t ) * numpy.sinc( t/3.0 ), 0 )
+
+scaleKernels = { 'bilinear' : (bilinearKernel, 1),
+                 'bicubic'  : (bicubicKernel,  2),
+                 'lanczos3' : (lanczos3Kernel, 3) }
+
+
+
+# Weight table along one axis of length 'size'.  Returns a (size,taps)
+# array of source indices, a matching array of weights (summing to 1
+# along each row) and a boolean array marking the destination indices
+# whose source is outside the image.  Taps that fall outside the image
+# use the nearest edge pixel.
+
+def scaleWeights( size, factor, mode ):
+
+  nearest, outside = scaleMap( size, factor )
+
+  if mode == 'nearest':
+    return nearest[:,None], numpy.ones( (size,1), numpy.float32 ), outside
+
+  kernel, radius = scaleKernels[mode]
+
+  # Continuous source position of each destination index
+
+  src = (numpy.arange( size ) - size/2) / float(factor) + size/2
+
+  taps = numpy.floor( src )[:,None].astype( numpy.intp ) + numpy.arange( 1-radius, radius+1 )[None,:]
+
+  weights = kernel( src[:,None] - taps )
+  weights = (weights / weights.sum( axis=1 )[:,None]).astype( numpy.float32 )
+
+  return numpy.clip( taps, 0, size-1 ), weights, outside
+
+
+
+# Time scale() in each interpolation mode on the current image and
+# report the throughput in megapixels per second.
+
+def benchmarkScale( factor = 1.37, runs = 5 ):
+
+  import time
+
   width  = currentImage.size[0]
   height = currentImage.size[1]
 
-  srcPixels = tempImage.load()
-  dstPixels = currentImage.load()
-  
-  # xp, yp are x' and y' (prime) respectively, the points in the destination image for backwards projection
-  # We loop through the current width and height because we are only concerned about drawing the pixels within
-  # this "canvas" area
-  for xp in range(width):
-    for yp in range(height):
-      
-      # Translate coordinates by center coordinate
-      xp = xp - width/2
-      yp = yp - height/2    
-      
-      # Backwards projection to source image by diving by factor instead of multiplying, rounding to ensure legal value
-      x = round(xp/factor)
-      y = round(yp/factor)
-      
-      # Translate back to image origin (0,0)
-      x = x + width/2
-      y = y + height/2 
-      
-      # Translate xp and yp back as well, to draw to correct area in canvas
-      xp = xp + width/2
-      yp = yp + height/2  
-      
-      # Only source from legal image values within dimensions of canvas
-      if x < width and y < height and x > -1 and y > -1:
-        dstPixels[xp,yp] = srcPixels[x,y]
-	
-      # Otherwise, assign to pixel to white 
-      else:
-        dstPixels[xp,yp] = (255,128,128)      
-  
-  print 'scale image by %f' % factor
+  print 'scaling %dx%d image by %g, %d runs per mode' % (width, height, factor, runs)
+
+  result = YCbCrImage( width, height )
+
+  baseline = None
+
+  for mode in scaleModes:
+
+    scale( currentImage, result, factor, mode ) # build and cache the weights
+
+    start = time.time()
+    for i in range( runs ):
+      scale( currentImage, result, factor, mode )
+    elapsed = (time.time() - start) / runs
+
+    rate = width * height / elapsed / 1.0e6
+    if baseline is None:
+      baseline = rate
+
+    print '  %-9s %8.1f Mpixels/s  (%.2fx nearest)' % (mode, rate, rate / baseline)
 
   
 
 # Set up the display and draw the current image
 
+displayPixels = None # (image, width, height, RGB bytes) of the image last drawn
+
 def display():
 
   # Clear window
@@ -194,25 +652,39 @@ def display():
   glClearColor ( 1, 1, 1, 0 )
   glClear( GL_COLOR_BUFFER_BIT )
 
-  # rebuild the image
+  # While dragging, show the preview, enlarged to the size of the full image
+
+  if button is not None and dragPosition is not None:
+    img  = previewImage
+    zoom = previewStep
+  else:
+    img  = currentImage
+    zoom = 1
+
+  # rebuild the RGB pixels only if the image has changed since the last redraw
+
+  global displayPixels
 
-  img = currentImage.convert( 'RGB' )
+  if displayPixels is None or displayPixels[0] is not img or img.changed:
+    rgb = img.toPIL().convert( 'RGB' )
+    displayPixels = (img, rgb.size[0], rgb.size[1], rgb.tobytes())
+    img.changed = False
 
-  width  = img.size[0]
-  height = img.size[1]
+  img, width, height, imageData = displayPixels
 
   # Find where to position lower-left corner of image
 
-  baseX = (windowWidth-width)/2
-  baseY = (windowHeight-height)/2
+  baseX = (windowWidth-currentImage.size[0])/2
+  baseY = (windowHeight-currentImage.size[1])/2
 
   glWindowPos2i( baseX, baseY )
 
-  # Get pixels and draw
-
-  imageData = numpy.array( list( img.getdata() ), numpy.uint8 )
+  # Draw directly from the packed RGB bytes
 
+  glPixelStorei( GL_UNPACK_ALIGNMENT, 1 )
+  glPixelZoom( zoom, zoom )
   glDrawPixels( width, height, GL_RGB, GL_UNSIGNED_BYTE, imageData )
+  glPixelZoom( 1, 1 )
 
   glutSwapBuffers()
 
@@ -222,7 +694,7 @@ def display():
 
 def keyboard( key, x, y ):
 
-  global localHistoRadius
+  global localHistoRadius, histoEqMode, scaleMode, integralHisto
 
   if key == '\033': # ESC = exit
     sys.exit(0)
@@ -242,6 +714,21 @@ def keyboard( key, x, y ):
   elif key == 'h':
     performHistoEqualization( localHistoRadius )
 
+  elif key == 'e':
+    if histoEqMode == 'sliding':
+      histoEqMode = 'integral'
+    else:
+      histoEqMode = 'sliding'
+    integralHisto = None
+    print 'histogram equalization mode =', histoEqMode
+
+  elif key == 'i':
+    scaleMode = scaleModes[ (scaleModes.index( scaleMode ) + 1) % len(scaleModes) ]
+    print 'interpolation =', scaleMode
+
+  elif key == 'b':
+    benchmarkScale()
+
   elif key in ['+','=']:
     localHistoRadius = localHistoRadius + 1
     print 'radius =', localHistoRadius
@@ -269,16 +756,18 @@ def keyboard( key, x, y ):
 
 def loadImage( path ):
 
-  global currentImage
+  global currentImage, integralHisto
+
+  currentImage = YCbCrImage.fromPIL( Image.open( path ).transpose( Image.FLIP_TOP_BOTTOM ) )
 
-  currentImage = Image.open( path ).convert( 'YCbCr' ).transpose( Image.FLIP_TOP_BOTTOM )
+  integralHisto = None # its tables are for the previous image
 
 
 def saveImage( path ):
 
   global currentImage
 
-  currentImage.transpose( Image.FLIP_TOP_BOTTOM ).convert('RGB').save( path )
+  currentImage.toPIL().transpose( Image.FLIP_TOP_BOTTOM ).convert('RGB').save( path )
   
 
 
@@ -304,20 +793,66 @@ initY = 0
 
 
 
+# Dragging state
+#
+# Motion events only record the latest mouse position.  The operation
+# is applied once the pending events have been handled (in the idle
+# callback), so events that arrive while an operation is running are
+# replaced by the newest one instead of each being processed.
+#
+# While the button is held, the operation is applied to a subsampled
+# copy of tempImage with at most 'maxPreviewPixels' pixels, so the
+# time per update does not depend on the image size.  The full
+# resolution result is computed once, when the button is released.
+
+maxPreviewPixels = 512 * 512
+
+dragPosition = None # latest mouse position during the drag, or None if the mouse hasn't moved
+dragPending  = False # dragPosition has not yet been applied to the preview
+
+previewStep  = 1    # preview takes every previewStep'th row and column of tempImage
+tempPreview  = None # subsampled tempImage
+previewImage = None # subsampled result of the drag so far
+
+
+
 # Handle mouse click/release
 
 def mouse( btn, state, x, y ):
 
-  global button, initX, initY, tempImage
+  global button, initX, initY, tempImage, tempPreview, previewImage, previewStep, dragPosition, dragPending
 
   if state == GLUT_DOWN:
-    tempImage = currentImage.copy()
+    if tempImage is None:
+      tempImage = YCbCrImage( currentImage.size[0], currentImage.size[1] )
+    tempImage.copyFrom( currentImage ) # reuses tempImage's arrays from the last click
+
+    width  = currentImage.size[0]
+    height = currentImage.size[1]
+    previewStep = max( 1, int( math.ceil( math.sqrt( width * height / float(maxPreviewPixels) ) ) ) )
+
+    if tempPreview is None:
+      tempPreview  = YCbCrImage( 1, 1 )
+      previewImage = YCbCrImage( 1, 1 )
+    tempPreview.copyFrom( tempImage, previewStep )
+    previewImage.copyFrom( tempPreview )
+
     button = btn
     initX = x
     initY = y
+    dragPosition = None
+    dragPending  = False
+
   elif state == GLUT_UP:
-    tempImage = None
+
+    # Compute the full resolution result for the final position
+
+    if button is not None and dragPosition is not None:
+      applyDrag( dragPosition[0], dragPosition[1], True )
+
     button = None
+    dragPosition = None
+    dragPending  = False
 
   glutPostRedisplay()
 
@@ -327,12 +862,52 @@ def mouse( btn, state, x, y ):
 
 def motion( x, y ):
 
+  global dragPosition, dragPending
+
+  if button in [GLUT_LEFT_BUTTON, GLUT_RIGHT_BUTTON]:
+
+    dragPosition = (x,y)
+
+    if not dragPending:
+      dragPending = True
+      glutIdleFunc( idle )
+
+
+
+# Apply the latest drag position to the preview once all pending
+# events have been handled
+
+def idle():
+
+  global dragPending
+
+  glutIdleFunc( None )
+
+  if dragPending and button is not None:
+    applyDrag( dragPosition[0], dragPosition[1], False )
+    glutPostRedisplay()
+
+  dragPending = False
+
+
+
+# Apply the operation of the button being dragged for the mouse at
+# (x,y), either to the full resolution image or to the preview.
+
+def applyDrag( x, y, fullResolution ):
+
   if button == GLUT_LEFT_BUTTON:
 
     diffX = x - initX
     diffY = y - initY
 
-    applyBrightnessAndContrast( 255 * diffX/float(windowWidth), 1 + diffY/float(windowHeight) )
+    brightness = 255 * diffX/float(windowWidth)
+    contrast   = 1 + diffY/float(windowHeight)
+
+    if fullResolution:
+      applyBrightnessAndContrast( brightness, contrast )
+    else:
+      adjustBrightnessAndContrast( tempPreview, previewImage, brightness, contrast )
 
   elif button == GLUT_RIGHT_BUTTON:
 
@@ -346,25 +921,158 @@ def motion( x, y ):
     newPosY = y - float(windowHeight)/2.0
     newDist = math.sqrt( newPosX*newPosX + newPosY*newPosY )
 
-    scaleImage( newDist / initDist )
+    if fullResolution:
+      scaleImage( newDist / initDist )
+    else:
+      scale( tempPreview, previewImage, newDist / initDist, scaleMode )
 
-  glutPostRedisplay()
-  
 
 
-# Run OpenGL
+# Batch mode
+#
+# Apply the operations to every image in a directory and write the
+# results, with the same filenames, to another directory.  The
+# operations are applied in the order brightness/contrast, local
+# histogram equalization, scaling, and only if requested.
+
+imageExtensions = [ '.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.ppm', '.pgm' ]
+
+def batchMain( args ):
+
+  import argparse, time, multiprocessing
+
+  parser = argparse.ArgumentParser( prog='main.py batch', description='Apply image operations to a directory of images.' )
+  parser.add_argument( 'inputDir',  help='directory of images to process' )
+  parser.add_argument( 'outputDir', help='directory in which to write the results' )
+  parser.add_argument( '--brightness', type=float, default=None, help='brightness offset (default 0)' )
+  parser.add_argument( '--contrast',   type=float, default=None, help='contrast factor (default 1)' )
+  parser.add_argument( '--radius',     type=int,   default=None, help='apply local histogram equalization with this radius' )
+  parser.add_argument( '--histo-mode', dest='histoMode', choices=['sliding','integral'], default=histoEqMode, help='local histogram equalization method' )
+  parser.add_argument( '--histo-jobs', dest='histoJobs', type=int, default=histoEqJobs, help='number of processes for each sliding-window equalization' )
+  parser.add_argument( '--scale',      type=float, default=None, help='scale about the image centre by this factor' )
+  parser.add_argument( '--interpolation', choices=scaleModes, default=scaleMode, help='interpolation used when scaling' )
+  parser.add_argument( '--jobs', type=int, default=1, help='number of images to process in parallel' )
+  options = parser.parse_args( args )
+
+  if options.jobs > 1 and options.histoJobs > 1:
+    print 'note: --histo-jobs is ignored when --jobs > 1 (images are already processed in parallel)'
+    options.histoJobs = 1
+
+  if not os.path.isdir( options.outputDir ):
+    os.makedirs( options.outputDir )
+
+  tasks = []
+  for filename in sorted( os.listdir( options.inputDir ) ):
+    if os.path.splitext( filename )[1].lower() in imageExtensions:
+      tasks.append( (os.path.join( options.inputDir, filename ), os.path.join( options.outputDir, filename ), options) )
+
+  start = time.time()
+
+  if options.jobs > 1:
+    pool = multiprocessing.Pool( options.jobs )
+    results = pool.imap_unordered( batchProcess, tasks )
+  else:
+    results = (batchProcess( task ) for task in tasks)
+
+  failed = 0
+
+  for path, seconds, error in results:
+    if error is None:
+      print '%s: %.2f seconds' % (path, seconds)
+    else:
+      print '%s: failed (%s)' % (path, error)
+      failed += 1
+
+  if options.jobs > 1:
+    pool.close()
+    pool.join()
+
+  print '%d images (%d failed) in %.2f seconds' % (len(tasks), failed, time.time() - start)
+
+
+
+# Process one image in batch mode.  'task' is (input path, output
+# path, options).  Returns (input path, seconds taken, error message
+# or None), so that an image that can't be processed doesn't stop the
+# others.
+
+def batchProcess( task ):
+
+  import time
+
+  global tempImage, histoEqMode, histoEqJobs, scaleMode
+
+  inputPath, outputPath, options = task
+
+  start = time.time()
+
+  try:
+    loadImage( inputPath )
+
+    if tempImage is None:
+      tempImage = YCbCrImage( 1, 1 )
+
+    if options.brightness is not None or options.contrast is not None:
+      tempImage.copyFrom( currentImage )
+      applyBrightnessAndContrast( options.brightness or 0, options.contrast if options.contrast is not None else 1 )
+
+    if options.radius is not None:
+      histoEqMode = options.histoMode
+      histoEqJobs = options.histoJobs
+      performHistoEqualization( options.radius )
+
+    if options.scale is not None:
+      scaleMode = options.interpolation
+      tempImage.copyFrom( currentImage )
+      scaleImage( options.scale )
+
+    saveImage( outputPath )
+  except Exception, e:
+    return inputPath, time.time() - start, str(e) or e.__class__.__name__
+
+  return inputPath, time.time() - start, None
+
+
+
+if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+
+  if __name__ == '__main__': # not when imported by a worker process
+    batchMain( sys.argv[2:] )
+
+else:
+
+  try: # PyOpenGL
+    from OpenGL.GLUT import *
+    from OpenGL.GL import *
+    from OpenGL.GLU import *
+  except:
+    print 'Error: PyOpenGL has not been installed.'
+    sys.exit(0)
+
+  # File dialog (doesn't work on Mac OSX)
+
+  if sys.platform != 'darwin':
+    import Tkinter, tkFileDialog
+    root = Tkinter.Tk()
+    root.withdraw()
+
+  # Load the initial image
+
+  currentImage = YCbCrImage.fromPIL( Image.open( os.path.join( imgDir, imgFilename ) ).transpose( Image.FLIP_TOP_BOTTOM ) )
+
+  # Run OpenGL
 
-glutInit()
-glutInitDisplayMode( GLUT_DOUBLE | GLUT_RGB )
-glutInitWindowSize( windowWidth, windowHeight )
-glutInitWindowPosition( 50, 50 )
+  glutInit()
+  glutInitDisplayMode( GLUT_DOUBLE | GLUT_RGB )
+  glutInitWindowSize( windowWidth, windowHeight )
+  glutInitWindowPosition( 50, 50 )
 
-glutCreateWindow( 'imaging' )
+  glutCreateWindow( 'imaging' )
 
-glutDisplayFunc( display )
-glutKeyboardFunc( keyboard )
-glutReshapeFunc( reshape )
-glutMouseFunc( mouse )
-glutMotionFunc( motion )
+  glutDisplayFunc( display )
+  glutKeyboardFunc( keyboard )
+  glutReshapeFunc( reshape )
+  glutMouseFunc( mouse )
+  glutMotionFunc( motion )
 
-glutMainLoop()
+  glutMainLoop()
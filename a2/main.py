@@ -3,6 +3,14 @@
 # Removal of periodic features using the FFT
 #
 # Use Python 2.7 with these packages: numpy, PyOpenGL, Pillow
+#
+# The grid can also be removed without a display, from every image in
+# a directory (or matching a pattern), with
+#
+#   python main.py batch {input dir or pattern} {output dir} [options]
+#
+# Run 'python main.py batch -h' for the options.  PyOpenGL is not
+# needed in that case, nor for the other command-line commands.
 
 import sys, os, math, pprint
 
@@ -10,10 +18,6 @@ import numpy as np
 
 from PIL import Image, ImageOps
 
-from OpenGL.GLUT import *
-from OpenGL.GL import *
-from OpenGL.GLU import *
-
 
 # Globals
 
@@ -23,7 +27,18 @@ windowHeight =  800
 showMagnitude = True            # for the FT, show the magnitude.  Otherwise, show the phase
 doHistoEq = False               # do histogram equalization on the FT to make features more obvious
 
-texID = None                    # for OpenGL
+realFT = False                  # images are real, so use the real-input FT, which stores only half of the spectrum
+
+padFT = False                   # pad images to a size with no prime factors > 5 before the FT, which is faster
+padMode = 'zero'                # how to fill the padding: 'zero', 'reflect' or 'mean'
+padModes = [ 'zero', 'reflect', 'mean' ]
+ftImageShape = None             # (height,width) of the image of the last forward FT, to which the inverse FT is cropped
+
+imageCacheDir = os.environ.get( 'IMAGE_CACHE' ) # directory of .npy copies of loaded images, which are memory-mapped (None = no cache)
+outputRows = 512                # rows of an output image that are converted at a time
+
+textures = {}                   # for OpenGL: (row,col) -> [texture ID, shown array, key, shape]
+displayGeneration = 0           # incremented when the shown arrays change in place
 
 zoom = 1.0                      # amount by which to zoom images
 translate = (0.0,0.0)           # amount by which to translate images
@@ -98,101 +113,91 @@ def compute():
   height = image.shape[0]
   width  = image.shape[1]
 
+  ftHeight, ftWidth = ftSize( image.shape ) #size of the FT, which is larger than the image if padded
+
   # Forward FT
   print '1. compute FT'
   imageFT = forwardFT(image) #compute the fourier transform of image and store it in imageFT
 
   # Compute magnitudes and find the maximum (excluding the DC component)
-  mags = [[0 for x in range(width)] for y in range(height)] #declare a 2D list the same size as imageFT
   print '2. computing FT magnitudes'
-  for h in range(height):
-    for w in range(width):
-      mags[h][w] = magFromComplex(imageFT[h,w]) #compute the magnitude of imageFT and store the value in the corresponding location in mags
-	  
-  tempZero = mags[0][0] #store the DC component in a temporary variable
-  mags[0][0] = 0 #set the DC component to 0
-  maxMag = max(map(max, mags)) #compute maximum magnitude
-  mags[0][0] = tempZero #return the original value to the origin
+  mags = magFromComplex(imageFT) #compute the magnitudes of all of imageFT at once
+
+  dc = mags[0,0] #store the DC component in a temporary variable
+  mags[0,0] = 0 #set the DC component to 0 so that it is excluded from the maximum
+  maxMag = mags.max() #compute maximum magnitude
+  mags[0,0] = dc #return the original value to the origin
 
   # Zero the components that are less than 40% of the max
   print '3. removing low-magnitude components'
 
-  if gridImageFT is None:
-    gridImageFT = np.zeros( (height,width), dtype=np.complex_ )
-	
-  zeroed = [[False for x in range(width)] for y in range(height)] #storing which ones we did and did not set to zero for later
   threshold = 0.4 * maxMag #set threshold value
- 
-  for h in range(height):
-    for w in range(width):
-      if mags[h][w] < threshold:
-        gridImageFT[h,w] = 0 #set to zero if below threshold
-        zeroed[h][w] = True #indicate this pixel has been set to zero
-      else:
-        gridImageFT[h,w] = imageFT[h,w] #otherwise copy value to gridImageFT unchanged
-  
+
+  kept = mags >= threshold #mask of the components that are kept (i.e. not set to zero)
+
+  gridImageFT = np.where(kept, imageFT, 0) #copy the kept components to gridImageFT and zero the rest
+
+  if realFT:
+    kept = expandHalfSpectrum(kept, ftWidth) #the peak search below covers all horizontal frequencies
+
   print '4. finding angles and distances of grid lines'
   
   # Find (angle, distance) to each peak
   # lines = [ (angle1,distance1), (angle2,distance2) ]
   
-  points = [] #instantiate list
+  #if the FT is padded, its frequencies are scaled to those of an FT of the image's size
 
-  #iterate through the pixels in the bottom half of gridImageFT
-  
-  for h in range((height/2)):
-    for w in range(width):
-      if (zeroed[h][w] == False): #filter out all pixels that have been set to zero
-        
-        angle = None
-        distance = None
-
-        if w > (width/2): #divide the bottom half of the image into two quadrants
-          distance = np.sqrt(np.square(h) + np.square(w-width)) #calculate the distance to the point from the origin
-          angle = (np.arctan2(h,(w - width))) * 180.0 / np.pi #calculate the angle of the point wrt the origin
-          if angle >= 180:
-            angle = angle - 180 #ensure all angles are under 180 degrees
-        else: #iterate through the second quadrant
-          distance = np.sqrt(np.square(h) + np.square(w)) #calculate the distance to the point from the origin
-          angle = (np.arctan2(h,w)) * 180.0 / np.pi #calculate the angle of the point wrt the origin
-          if angle >= 180:
-            angle = angle - 180 #ensure all angles are under 180 degrees
-
-        if distance > 15: #eliminate points that are too close to the origin
-          point = [angle, distance]
-          points.append(point) #add new points to the list points
-  
-  points = sorted(points,key=lambda x: x[0]) #sort the list by angle 
-  
-  firstAngle = points[0][0]
-  split = None
-  for i in range(len(points)):
-    if abs(points[i][0] - firstAngle) > 60: #index where to split the list by angle value
-      split = i 
-      break
-
-  pointsA = points[:split] #split the original list points into lists pointsA and pointsB
-  pointsB = points[split:]
-
-  angle1 = [float(sum(a))/len(a) for a in zip(*pointsA)][0] #calculate average angle for pointsA
-  angle2 = [float(sum(b))/len(b) for b in zip(*pointsB)][0] #calculate average angle for pointsB
-
-  distance1 = pointsA[0][1]
-  for i in range(len(pointsA)):
-    if pointsA[i][1] < distance1:
-      distance1 = pointsA[i][1] #find the distance that is closest to the origin in pointsA
-
-  distance2 = pointsB[0][1]
-  for i in range(len(pointsB)):
-    if pointsB[i][1] < distance2:
-      distance2 = pointsB[i][1] #find the distance that is closest to the origin in pointsA
-
-  lines = [ (angle1,distance1), (angle2,distance2) ]
+  scaleY = height / float(ftHeight)
+  scaleX = width  / float(ftWidth)
+
+  #locations of the components in the bottom half of gridImageFT that have not been set to zero
+
+  hs, ws = np.nonzero(kept[:ftHeight/2])
+
+  #divide the bottom half of the image into two quadrants: columns past the middle are negative frequencies
+
+  ys = hs * scaleY
+  xs = np.where(ws > ftWidth/2, ws - ftWidth, ws) * scaleX
+
+  distances = np.sqrt(np.square(ys) + np.square(xs)) #calculate the distance to each point from the origin
+  angles = np.arctan2(ys, xs) * 180.0 / np.pi #calculate the angle of each point wrt the origin
+  angles[angles >= 180] -= 180 #ensure all angles are under 180 degrees
+
+  farEnough = distances > 15 #eliminate points that are too close to the origin
+  angles = angles[farEnough]
+  distances = distances[farEnough]
+
+  if angles.size == 0:
+    print 'no grid lines found'
+    lines = []
+  else:
+
+    order = np.argsort(angles, kind='mergesort') #sort the points by angle
+    angles = angles[order]
+    distances = distances[order]
+
+    #split the points into two groups at the first angle more than 60 degrees from the smallest angle
+
+    beyond = np.flatnonzero(angles - angles[0] > 60)
+
+    if beyond.size > 0:
+      groupA = slice(0, beyond[0])
+      groupB = slice(beyond[0], None)
+    else:
+      groupA = groupB = slice(None) #no split, so both groups have all points
+
+    angle1 = angles[groupA].mean() #calculate average angle for each group
+    angle2 = angles[groupB].mean()
+
+    distance1 = distances[groupA].min() #find the distance that is closest to the origin in each group
+    distance2 = distances[groupB].min()
+
+    lines = [ (angle1,distance1), (angle2,distance2) ]
   
   # Convert back to spatial domain to get a grid-like image
   print '5. inverse FT'
 
-  gridImage = inverseFT(gridImageFT) #take the inverse FT of gridImageFT to get gridImage
+  gridImage = inverseFT(gridImageFT, (height,width)) #take the inverse FT of gridImageFT to get gridImage
   
   if gridImage is None:
     gridImage = np.zeros( (height,width), dtype=np.complex_ )
@@ -200,30 +205,20 @@ def compute():
   # Remove grid image from original image
   print '6. remove grid'
 
-  resultImage = np.zeros( (height,width), dtype=np.complex_ )
+  #the result is real, and its buffer is reused by later computations on images of the same size
 
-  for h in range(height):
-    for w in range(width):
-      if(gridImage[h,w] > 16): #if the grid is bright at this pixel
-        resultImage[h,w] = 0 #remove the pixel in the original image (to remove grid)
-      else:
-        resultImage[h,w] = image[h,w].copy() #otherwise keep original value
+  if resultImage is None or resultImage.shape != (height,width) or resultImage.dtype != np.float_:
+    resultImage = np.empty( (height,width), dtype=np.float_ )
 
-  if resultImage is None:
-    resultImage = image.copy()
-  print 'done'
+  #keep the original value where the grid is not bright (i.e. not > 16), and zero it elsewhere to remove the grid
 
-  return resultImage, lines
+  np.multiply(np.real(image), np.real(gridImage) <= 16, out=resultImage)
 
+  print 'done'
 
-      
-
-# File dialog
+  return resultImage, lines
 
-import Tkinter, tkFileDialog
 
-root = Tkinter.Tk()
-root.withdraw()
 
 
 
@@ -231,10 +226,28 @@ root.withdraw()
 #
 # Input is a 2D numpy array of complex values.
 # Output is the same.
+#
+# With 'realFT', the input is real and only the non-negative
+# horizontal frequencies are returned (an array of width/2+1 columns).
+# The others follow from the Hermitian symmetry of the FT of a real
+# image (see expandHalfSpectrum).
+#
+# With 'padFT', the image is first padded to ftSize( image.shape ),
+# and its shape is remembered so that inverseFT can crop back to it.
 
 def forwardFT( image ):
 
-  return np.fft.fft2( image )
+  global ftImageShape
+
+  ftImageShape = image.shape
+
+  if padFT:
+    image = padForFT( image )
+
+  if realFT:
+    return runFFT( 'rfft2', np.real( image ) )
+
+  return runFFT( 'fft2', image )
 
 
 
@@ -242,11 +255,309 @@ def forwardFT( image ):
 #
 # Input is a 2D numpy array of complex values.
 # Output is the same.
+#
+# 'shape' is the (height,width) of the image to return, which is that
+# of the last forward FT if not given.  With 'realFT', the input has
+# only the non-negative horizontal frequencies.  With 'padFT', the
+# result is cropped from the padded size back to 'shape'.
+
+
+def inverseFT( image, shape = None ):
+
+  if shape is None:
+    shape = ftImageShape
+
+  if realFT:
+    result = runFFT( 'irfft2', image, ftSize( shape ) )
+  else:
+    result = runFFT( 'ifft2', image )
+
+  if result.shape != tuple( shape ):
+    result = result[:shape[0],:shape[1]]
+
+  return result
+
+
+
+# FFT backend
+#
+# forwardFT and inverseFT call the FFTs of one of these packages:
+#
+#   numpy   numpy.fft (the default)
+#   pyfftw  FFTW through pyFFTW, using FFT_WORKERS threads
+#
+# The backend is chosen with the FFT_BACKEND environment variable.  If
+# its package isn't installed, numpy is used instead.  (scipy.fft isn't
+# offered: it needs SciPy 1.4, which doesn't support Python 2.7.)
+#
+# FFTW plans the best way to compute each size of FFT before the first
+# FFT of that size, which is slow.  The plans are kept for the rest of
+# the run, and FFTW's accumulated knowledge ('wisdom') is saved to the
+# file FFT_WISDOM, so that later runs on images of the same size and
+# type can skip most of the planning.
+
+fftBackend = None                # name of the backend in use
+fftPackage = None                # module providing the backend's FFTs
+
+fftWorkers = int( os.environ.get( 'FFT_WORKERS', '-1' ) ) # number of threads (-1 = one per core)
+
+fftWisdomPath = os.environ.get( 'FFT_WISDOM', os.path.join( os.path.expanduser( '~' ), '.fftw_wisdom.pickle' ) )
+
+fftPlans = {}                    # pyFFTW plans, keyed by (function, shape, dtype, output size)
+
+
+
+def selectFFTBackend( name ):
+
+  global fftBackend, fftPackage
+
+  if name == 'pyfftw':
+    try:
+      import pyfftw, pyfftw.builders
+      fftBackend, fftPackage = 'pyfftw', pyfftw
+      loadFFTWisdom()
+      return
+    except ImportError:
+      print 'pyFFTW is not installed: using numpy FFTs'
+
+  elif name != 'numpy':
+    print "FFT backend '%s' not understood: using numpy FFTs" % name
+
+  fftBackend, fftPackage = 'numpy', np.fft
+
+
+
+# Apply the FFT function 'name' ('fft2', 'ifft2', 'rfft2' or 'irfft2')
+# to 'a', with output size 's' (as in numpy.fft), using the selected
+# backend.
+
+def runFFT( name, a, s = None ):
+
+  if fftBackend == 'pyfftw':
+
+    key = (name, a.shape, a.dtype.str, s)
+
+    if key not in fftPlans:
+      threads = fftWorkers
+      if threads < 1:
+        import multiprocessing
+        threads = multiprocessing.cpu_count()
+      fftPlans[key] = getattr( fftPackage.builders, name )( a, s=s, threads=threads, planner_effort='FFTW_MEASURE' )
+      saveFFTWisdom()
+
+    # FFTW may overwrite the input (and does for 2D irfft2), so the
+    # caller's array is copied into the plan's own input array
+
+    plan = fftPlans[key]
+    plan.input_array[...] = a
+
+    return plan().copy() # the plan reuses its output array on the next call
+
+  return getattr( fftPackage, name )( a, s=s )
+
+
+
+def loadFFTWisdom():
+
+  import cPickle
+
+  if os.path.exists( fftWisdomPath ):
+    try:
+      with open( fftWisdomPath, 'rb' ) as f:
+        fftPackage.import_wisdom( cPickle.load( f ) )
+    except Exception, e:
+      print 'Could not load FFTW wisdom from %s: %s' % (fftWisdomPath, e)
+
+
+
+def saveFFTWisdom():
+
+  import cPickle
+
+  # Written under a temporary name, then renamed, so that processes
+  # saving at the same time (e.g. batch workers) can't leave a
+  # truncated or interleaved file
+
+  tempPath = '%s.%d.tmp' % (fftWisdomPath, os.getpid())
+
+  try:
+    with open( tempPath, 'wb' ) as f:
+      cPickle.dump( fftPackage.export_wisdom(), f, cPickle.HIGHEST_PROTOCOL )
+    os.rename( tempPath, fftWisdomPath )
+  except Exception, e:
+    print 'Could not save FFTW wisdom to %s: %s' % (fftWisdomPath, e)
+    if os.path.exists( tempPath ):
+      os.remove( tempPath )
+
+
+
+selectFFTBackend( os.environ.get( 'FFT_BACKEND', 'numpy' ) )
+
+
+
+# FFTs are fastest for sizes with only small prime factors.  Return
+# the smallest n' >= n with no prime factors other than 2, 3 and 5.
+
+def nextFastSize( n ):
+
+  while True:
+    m = n
+    for p in [2,3,5]:
+      while m % p == 0:
+        m = m / p
+    if m == 1:
+      return n
+    n = n + 1
+
+
+
+# Return the (height,width) of the FT of an image of the given shape,
+# which is padded if 'padFT' is set.
+
+def ftSize( shape ):
+
+  if padFT:
+    return (nextFastSize( shape[0] ), nextFastSize( shape[1] ))
+
+  return (shape[0], shape[1])
+
+
+
+# Pad an image on the top and right to ftSize( image.shape ),
+# filling the padding according to 'padMode'.
+
+def padForFT( image ):
+
+  height = image.shape[0]
+  width  = image.shape[1]
+
+  padHeight, padWidth = ftSize( image.shape )
+
+  if (padHeight, padWidth) == (height, width):
+    return image
+
+  if padMode == 'reflect':
+    return np.pad( image, ((0,padHeight-height),(0,padWidth-width)), 'reflect' )
+
+  if padMode == 'mean':
+    padded = np.full( (padHeight,padWidth), np.mean( image ), image.dtype )
+  else:
+    padded = np.zeros( (padHeight,padWidth), image.dtype )
+
+  padded[:height,:width] = image
+
+  return padded
+
+
+
+# Time the forward and inverse FT with and without padding, on the
+# images in 'imageDir' and on synthetic images with prime dimensions.
+
+def benchmarkFT( runs = 3 ):
+
+  import time
+
+  global padFT
+
+  cases = []
+  for filename in [ 'ecg-01.png', 'ecg-02.png' ]:
+    cases.append( (filename, loadImage( os.path.join( imageDir, filename ) )) )
+  for (h,w) in [ (1009,1013), (1999,2003) ]:
+    synthetic = np.random.RandomState( h ).uniform( 0, 255, (h,w) )
+    if not realFT:
+      synthetic = synthetic.astype( np.complex_ )
+    cases.append( ('synthetic %dx%d' % (h,w), synthetic) )
+
+  savedPadFT = padFT
+
+  print 'forward + inverse FT (%s), best of %d runs, %s padding' % (fftBackend, runs, padMode)
+
+  for name, img in cases:
+
+    times = []
+    for pad in [ False, True ]:
+      padFT = pad
+      best = None
+      for i in range( runs ):
+        start = time.time()
+        inverseFT( forwardFT( img ), img.shape )
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+          best = elapsed
+      times.append( best )
+
+    padded = '%dx%d' % (nextFastSize( img.shape[0] ), nextFastSize( img.shape[1] ))
+    print '  %-22s %dx%d: %.3fs   padded to %s: %.3fs   speedup %.1fx' % (name, img.shape[0], img.shape[1], times[0], padded, times[1], times[0] / times[1])
+
+  padFT = savedPadFT
+
+
+
+# Switch padding on or off.  The existing FTs and results are
+# discarded, since they have the other size.
+
+def setPadFT( usePadFT ):
+
+  global padFT, imageFT, gridImage, gridImageFT, resultImage
+
+  padFT = usePadFT
+
+  imageFT = None
+  gridImage = None
+  gridImageFT = None
+  resultImage = None
+
+
+
+# Expand the non-negative horizontal frequencies 'half' of the FT of a
+# real image (as returned by forwardFT with 'realFT') to the full
+# 'width', using F[h,w] = conj( F[-h,-w] ).
+#
+# 'half' can also be something computed from the FT, such as a mask or
+# magnitudes.  'mirror' is applied to the values copied to the other
+# half: np.conj for the FT itself, np.negative for phases, and nothing
+# for magnitudes and masks.
+
+def expandHalfSpectrum( half, width, mirror = None ):
+
+  height = half.shape[0]
+  cols   = half.shape[1]
+
+  full = np.empty( (height,width), half.dtype )
+
+  full[:,:cols] = half
+
+  rows = (-np.arange( height )) % height  # -h
+  src  = width - np.arange( cols, width ) # -w
+
+  if mirror is None:
+    full[:,cols:] = half[rows][:,src]
+  else:
+    full[:,cols:] = mirror( half[rows][:,src] )
+
+  return full
+
+
+
+# Switch between the complex and the real-input FT.  The existing FTs
+# and results are discarded, since they have the other layout.
 
+def setRealFT( useRealFT ):
 
-def inverseFT( image ):
+  global realFT, image, imageFT, gridImage, gridImageFT, resultImage
 
-  return np.fft.ifft2( image )
+  realFT = useRealFT
+
+  if image is not None:
+    if realFT:
+      image = np.real( image ).copy()
+    else:
+      image = image.astype( np.complex_ )
+
+  imageFT = None
+  gridImage = None
+  gridImageFT = None
+  resultImage = None
 
 
 
@@ -269,19 +580,7 @@ def display():
 
   # Set up texturing
 
-  global texID
-  
-  if texID == None:
-    texID = glGenTextures(1)
-
-  glBindTexture( GL_TEXTURE_2D, texID )
-
   glTexEnvf(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
-  glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
-  glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
-  glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-  glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-  glTexParameterfv(GL_TEXTURE_2D, GL_TEXTURE_BORDER_COLOR, [1,0,0,1] );
 
   # Images to draw, in rows and columns
 
@@ -289,46 +588,26 @@ def display():
 
   for r in range(rows):
     for c in range(cols):
-      if toDraw[r][c] is not None:
-
-        if r == 0: # normal image in row 0 
-          img = toDraw[r][c]
-        else: # FT in column 1
-          img = np.fft.fftshift( toDraw[r][c] ) # shift FT so that origin is in centre (just for display)
-
-        height = scale * img.shape[0]
-        width  = scale * img.shape[1]
-
-        # Find lower-left corner
-
-        baseX = (horizSpacing + maxWidth ) * c + horizSpacing
-        baseY = (vertSpacing  + maxHeight) * (rows-1-r) + vertSpacing
+      if toDraw[r][c] is None:
+        releaseTexture( (r,c) )
+      else:
 
-        # Get pixels and draw
+        # Get the texture, which is only filled again if the image or the display mode has changed
 
         if r == 0: # for images (in row 0), show the real part of each pixel
-          show = np.real(img)
+          mode = None
         else: # for FT (in column 1), show magnitude or phase
-          ak =  2 * np.real(img)
-          bk = -2 * np.imag(img)
-          if showMagnitude:
-            show = np.log( 1 + np.sqrt( ak*ak + bk*bk ) ) # take the log because there are a few very large values (e.g. the DC component)
-          else:
-            show = np.arctan2( -1 * bk, ak )
+          mode = (showMagnitude, doHistoEq and c > 0, realFT)
 
-          if doHistoEq and c > 0:
-            show = histoEq( show ) # optionally, perform histogram equalization on FT image (but this takes time!)
+        shape = bindTexture( (r,c), toDraw[r][c], mode, lambda: displayPixels( toDraw[r][c], r, c ) )
 
-        # Put the image into a texture, then draw it
+        height = scale * shape[0]
+        width  = scale * shape[1]
 
-        max = show.max()
-        min = show.min()
-        if max == min:
-          max = min+1
-          
-        imgData = np.array( (np.ravel(show) - min) / (max - min) * 255, np.uint8 )
+        # Find lower-left corner
 
-        glTexImage2D( GL_TEXTURE_2D, 0, GL_INTENSITY, img.shape[1], img.shape[0], 0, GL_LUMINANCE, GL_UNSIGNED_BYTE, imgData )
+        baseX = (horizSpacing + maxWidth ) * c + horizSpacing
+        baseY = (vertSpacing  + maxHeight) * (rows-1-r) + vertSpacing
 
         # Include zoom and translate
 
@@ -401,6 +680,103 @@ def display():
 
   
 
+# Return the pixels in [0,255] to show for the image 'img' in row 'r'
+# and column 'c' of the display.
+
+def displayPixels( img, r, c ):
+
+  if r == 0: # for images (in row 0), show the real part of each pixel
+    show = np.real(img)
+  else: # for FT (in column 1), show magnitude or phase
+    show = None
+    if doHistoEq and c > 0:
+      show = getCachedHistoEq( img ) # equalized on an earlier redraw
+
+    if show is None:
+      ft = img
+      if realFT:
+        ft = expandHalfSpectrum( ft, ftSize( image.shape )[1], np.conj ) # show the whole FT, not just the stored half
+      ft = np.fft.fftshift( ft ) # shift FT so that origin is in centre (just for display)
+
+      ak =  2 * np.real(ft)
+      bk = -2 * np.imag(ft)
+      if showMagnitude:
+        show = np.log( 1 + np.sqrt( ak*ak + bk*bk ) ) # take the log because there are a few very large values (e.g. the DC component)
+      else:
+        show = np.arctan2( -1 * bk, ak )
+
+      if doHistoEq and c > 0:
+        show = histoEq( show ) # optionally, perform histogram equalization on FT image (cached for later redraws)
+        cacheHistoEq( img, show )
+
+  max = show.max()
+  min = show.min()
+  if max == min:
+    max = min+1
+
+  return np.array( (show - min) / (max - min) * 255, np.uint8 )
+
+
+
+# Bind the texture of display slot 'slot', which shows the array
+# 'source' in display 'mode'.  The pixels are only computed (by
+# calling 'getPixels') and uploaded when the array, the mode or
+# 'displayGeneration' has changed since the last upload, so that
+# redraws for panning and zooming just draw a quad.
+#
+# Returns the shape of the texture.
+
+def bindTexture( slot, source, mode, getPixels ):
+
+  entry = textures.get( slot )
+
+  if entry is None:
+    entry = [ glGenTextures(1), None, None, None ]
+    textures[slot] = entry
+
+    glBindTexture( GL_TEXTURE_2D, entry[0] )
+
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameterfv(GL_TEXTURE_2D, GL_TEXTURE_BORDER_COLOR, [1,0,0,1] );
+  else:
+    glBindTexture( GL_TEXTURE_2D, entry[0] )
+
+  key = (mode, displayGeneration)
+
+  if entry[1] is not source or entry[2] != key:
+    imgData = getPixels()
+    glTexImage2D( GL_TEXTURE_2D, 0, GL_INTENSITY, imgData.shape[1], imgData.shape[0], 0, GL_LUMINANCE, GL_UNSIGNED_BYTE, np.ravel(imgData) )
+    entry[1:] = [ source, key, imgData.shape ]
+
+  return entry[3]
+
+
+
+# Delete the texture of display slot 'slot', if it has one.
+
+def releaseTexture( slot ):
+
+  entry = textures.pop( slot, None )
+
+  if entry is not None:
+    glDeleteTextures( [ entry[0] ] )
+
+
+
+# Note that the shown arrays have changed in place (e.g. in
+# compute()), so that their textures are uploaded again.
+
+def imagesChanged():
+
+  global displayGeneration
+
+  displayGeneration += 1
+
+
+
 # Get information about how to place the images.
 #
 # toDraw                       2D array of complex images 
@@ -459,46 +835,64 @@ def getImagesInfo():
 
 def histoEq( pixels ):
 
-  # build histogram
-
-  h = [0] * 256 # counts
-
-  width  = pixels.shape[0]
-  height = pixels.shape[1]
+  # intensity level in [0,255] of each pixel
 
   min = pixels.min()
   max = pixels.max()
   if max == min:
     max = min+1
 
-  for i in range(width):
-    for j in range(height):
-      y = int( (pixels[i,j] - min) / (max-min) * 255 )
-      h[y] = h[y] + 1
+  levels = ((pixels - min) / (max-min) * 255).astype( np.intp )
+
+  # build histogram
+
+  h = np.bincount( levels.ravel(), minlength=256 ) # counts
 
   # Build T[r] = s
 
-  k = 256.0 / float(width * height) # common factor applied to all entries
+  k = 256.0 / float(pixels.size) # common factor applied to all entries
 
-  T = [0] * 256 # lookup table
-  
-  sum = 0
-  for i in range(256):
-    sum = sum + h[i]
-    T[i] = int( math.floor(k * sum) - 1 )
-    if T[i] < 0:
-      T[i] = 0
+  T = np.floor( k * np.cumsum( h ) ) - 1 # lookup table
+  T[T < 0] = 0
 
   # Apply T[r]
 
-  result = np.empty( pixels.shape )
+  return T[levels]
 
-  for i in range(width):
-    for j in range(height):
-      y = int( (pixels[i,j] - min) / (max - min) * 255 )
-      result[i,j] = T[y]
 
-  return result
+
+# Equalized FT images for display, so that redraws (e.g. when zooming
+# or panning) don't equalize again.  Maps (id of FT, showMagnitude) to
+# (FT, equalized image); the FT is kept so that its id can't be reused.
+
+histoEqCache = {}
+
+
+
+# Return the cached equalized display image of the FT 'ft' for the
+# current magnitude/phase mode, or None if there isn't one.
+
+def getCachedHistoEq( ft ):
+
+  entry = histoEqCache.get( (id(ft), showMagnitude) )
+
+  if entry is not None and entry[0] is ft:
+    return entry[1]
+
+  return None
+
+
+
+# Cache the equalized display image of the FT 'ft', forgetting those
+# of FTs that are no longer displayed.
+
+def cacheHistoEq( ft, equalized ):
+
+  for key, entry in histoEqCache.items():
+    if entry[0] is not imageFT and entry[0] is not gridImageFT:
+      del histoEqCache[key]
+
+  histoEqCache[ (id(ft), showMagnitude) ] = (ft, equalized)
   
 
 # Handle keyboard input
@@ -520,6 +914,7 @@ def keyboard( key, x, y ):
       gridImage = None
       gridImageFT = None
       resultImage = None
+      imagesChanged()
 
   elif key == 'm':
     showMagnitude = not showMagnitude
@@ -527,12 +922,21 @@ def keyboard( key, x, y ):
   elif key == 'h':
     doHistoEq = not doHistoEq
 
+  elif key == 'r':
+    setRealFT( not realFT )
+    print 'real-input FT' if realFT else 'complex FT'
+
+  elif key == 'p':
+    setPadFT( not padFT )
+    print 'padded FT (%s)' % padMode if padFT else 'unpadded FT'
+
   elif key == 'z':
     zoom = 1
     translate = (0,0)
 
   elif key == 'c': # compute
     resultImage, lines = compute()
+    imagesChanged()
     print 'Grid lines:'
     for line in lines:
       print '  angle %.1f, distance %d' % (line[0],line[1])
@@ -542,6 +946,8 @@ def keyboard( key, x, y ):
            c  compute the solution
            m  toggle between magnitude and phase in the FT  
            h  toggle histogram equalization in the FT  
+           r  toggle the real-input FT (half the spectrum memory)
+           p  toggle padding to a fast FT size
            i  load image
  right arrow  forward transform
   left arrow  inverse transform
@@ -576,6 +982,7 @@ def forwardFT_all():
 
   if image is not None:
     imageFT = forwardFT( image )
+    imagesChanged()
 
 
 
@@ -587,26 +994,69 @@ def inverseFT_all():
   global image, imageFT
 
   if image is not None: 
-    image = inverseFT( imageFT )
+    image = inverseFT( imageFT, image.shape )
+    imagesChanged()
 
 
     
 # Load an image
 #
-# Return the image as a 2D numpy array of complex_ values.
+# Return the image as a 2D numpy array of complex_ values (or float_
+# values with 'realFT').
+#
+# The pixels are decoded into a uint8 array and converted directly into
+# the result, so no intermediate Python objects are made.  If
+# 'imageCacheDir' is set, the result is also stored there as a .npy
+# file, which later loads of the same image map into memory (copy on
+# write) instead of decoding again.  The cache file is named after the
+# image's absolute path, size and modification time, so images with the
+# same name in different directories, or a changed image, don't share
+# one.  It is written under a temporary name and then renamed, so a
+# partly written file is never loaded.
 
 
 def loadImage( path ):
 
+  dtype = np.float_ if realFT else np.complex_
+
+  cachePath = None
+
+  if imageCacheDir is not None and os.path.exists( path ):
+    import hashlib
+    stat = os.stat( path )
+    key  = hashlib.sha1( '%s\0%d\0%r' % (os.path.abspath( path ), stat.st_size, stat.st_mtime) ).hexdigest()[:16]
+    cachePath = os.path.join( imageCacheDir, '%s.%s.%s.npy' % (os.path.basename( path ), key, np.dtype( dtype ).name) )
+    if os.path.exists( cachePath ):
+      try:
+        return np.load( cachePath, mmap_mode='c' )
+      except Exception, e:
+        print 'Could not map cached image %s: %s' % (cachePath, e)
+
   try:
-    img = Image.open( path ).convert( 'L' ).transpose( Image.FLIP_TOP_BOTTOM )
+    img = Image.open( path ).convert( 'L' )
   except:
     print 'Failed to load image %s' % path
     sys.exit(1)
 
-  img = ImageOps.invert(img)
+  pixels = np.asarray( img )[::-1] # flip so that row 0 is at the bottom
+
+  del img
 
-  return np.array( list( img.getdata() ), np.complex_ ).reshape( (img.size[1],img.size[0]) )
+  if cachePath is None:
+    result = np.empty( pixels.shape, dtype )
+  else:
+    if not os.path.isdir( imageCacheDir ):
+      os.makedirs( imageCacheDir )
+    tempPath = '%s.%d.tmp' % (cachePath, os.getpid())
+    result = np.lib.format.open_memmap( tempPath, mode='w+', dtype=dtype, shape=pixels.shape )
+
+  np.subtract( 255, pixels, out=result ) # invert
+
+  if cachePath is not None:
+    result.flush()
+    os.rename( tempPath, cachePath ) # the mapping stays valid
+
+  return result
 
 
 
@@ -629,8 +1079,19 @@ def reshape( newWidth, newHeight ):
 #
 # The image has complex values, so output either the magnitudes or the
 # phases, according to the 'outputMagnitudes' parameter.
+#
+# With 'realFT', an FT holds only half of the spectrum, and 'width' is
+# the width of the full spectrum (by default, assumed to be even).
+#
+# The 8-bit pixels are computed 'outputRows' rows at a time.  If
+# 'filename' ends with '.npy', they are written to a memory-mapped .npy
+# file (top row first, as in other formats) instead of going through
+# Pillow, so very large images need little more memory than the input.
+
+def outputImage( image, filename, outputMagnitudes, isFT, invert, width = None ):
 
-def outputImage( image, filename, outputMagnitudes, isFT, invert ):
+  if isFT and realFT and width is None:
+    width = 2 * (image.shape[1] - 1)
 
   if not isFT:
     show = np.real(image)
@@ -639,19 +1100,38 @@ def outputImage( image, filename, outputMagnitudes, isFT, invert ):
     bk = -2 * np.imag(image)
     if outputMagnitudes:
       show = np.log( 1 + np.sqrt( ak*ak + bk*bk ) ) # take the log because there are a few very large values (e.g. the DC component)
+      if realFT:
+        show = expandHalfSpectrum( show, width )
     else:
       show = np.arctan2( -1 * bk, ak )
+      if realFT:
+        show = expandHalfSpectrum( show, width, np.negative )
     show = np.fft.fftshift( show ) # shift FT so that origin is in centre
 
   min = show.min()
   max = show.max()
 
-  img = Image.fromarray( np.uint8( (show - min) * (255 / (max-min)) ) ).transpose( Image.FLIP_TOP_BOTTOM )
+  height = show.shape[0]
 
-  if invert:
-    img = ImageOps.invert(img) 
-
-  img.save( filename )
+  if filename.endswith( '.npy' ):
+    pixels = np.lib.format.open_memmap( filename, mode='w+', dtype=np.uint8, shape=show.shape )
+  else:
+    pixels = np.empty( show.shape, np.uint8 )
+
+  for start in range( 0, height, outputRows ):
+    stop = start + outputRows
+    if stop > height:
+      stop = height
+    rows = np.uint8( (show[start:stop] - min) * (255 / (max-min)) )[::-1] # flip so that the top row is first
+    if invert:
+      np.subtract( 255, rows, out=rows )
+    pixels[height-stop:height-start] = rows
+
+  if filename.endswith( '.npy' ):
+    pixels.flush()
+    del pixels
+  else:
+    Image.fromarray( pixels ).save( filename )
 
 
 
@@ -713,12 +1193,22 @@ def mouse( button, state, x, y ):
       if image is None:
         return
 
+      isFT = (int(row) == 1) # FTs are in the second row of 'toDraw'
+
+      # Size of the image as displayed.  With 'realFT', an FT stores
+      # only half of the spectrum, but the whole spectrum is shown.
+
+      shape = image.shape
+
+      if isFT and realFT:
+        shape = (shape[0], ftSize( toDraw[0][0].shape )[1])
+
       # Get bounds of visible image
       #
       # Bounds are [cx-offset,cx+offset] x [cy-offset,cy+offset]
       
-      height = scale * image.shape[0]
-      width  = scale * image.shape[1]
+      height = scale * shape[0]
+      width  = scale * shape[1]
 
       cx     = 0.5 - translate[0]/width
       cy     = 0.5 - translate[1]/height
@@ -729,24 +1219,22 @@ def mouse( button, state, x, y ):
       xFraction = (col-math.floor(col)) / (maxWidth /float(maxWidth +horizSpacing))
       yFraction = (row-math.floor(row)) / (maxHeight/float(maxHeight+vertSpacing ))
 
-      pixelX = int( image.shape[1] * ((1-xFraction)*(cx-offset) + xFraction*(cx+offset)) )
-      pixelY = int( image.shape[0] * ((1-yFraction)*(cy+offset) + yFraction*(cy-offset)) )
+      pixelX = int( shape[1] * ((1-xFraction)*(cx-offset) + xFraction*(cx+offset)) )
+      pixelY = int( shape[0] * ((1-yFraction)*(cy+offset) + yFraction*(cy-offset)) )
       
       # for the FT images, move the position half up and half right,
       # since the image is displayed with that shift, while the FT array
       # stores the unshifted values.
 
-      isFT = (int(col) == 1)
-
       if isFT:
 
-        pixelX = pixelX - image.shape[1]/2
+        pixelX = pixelX - shape[1]/2
         if pixelX < 0:
-          pixelX = pixelX + image.shape[1]
+          pixelX = pixelX + shape[1]
 
-        pixelY = pixelY - image.shape[0]/2
+        pixelY = pixelY - shape[0]/2
         if pixelY < 0:
-          pixelY = pixelY + image.shape[0]
+          pixelY = pixelY + shape[0]
 
       # Perform the operation
       #
@@ -807,74 +1295,258 @@ def wrap( val, max ):
 
 
 
-# Load initial data
-#
-# The command line (stored in sys.argv) could have:
+# Batch mode
 #
-#     main.py {image filename}
+# Remove the grid from every image in a directory, or matching a glob
+# pattern, and write the result images to another directory, at the
+# same paths relative to the input directory (or, for a pattern, to the
+# directory before its first wildcard), so that images with the same
+# name in different directories are kept apart.  The detected grid
+# lines and the time taken for each image are written to a summary
+# file: CSV, or JSON if its name ends with '.json'.
+
+imageExtensions = [ '.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.ppm', '.pgm' ]
+
+def batchMain( args ):
+
+  import argparse, glob, time, multiprocessing, csv, json
+
+  global fftWorkers
+
+  parser = argparse.ArgumentParser( prog='main.py batch', description='Remove the grid from a set of ECG images.' )
+  parser.add_argument( 'input',     help='directory of images, or glob pattern (quoted) matching the images' )
+  parser.add_argument( 'outputDir', help='directory in which to write the results' )
+  parser.add_argument( '--summary', default=None, help='file for the grid lines and timings of each image, CSV or .json (default {outputDir}/lines.csv)' )
+  parser.add_argument( '--real',    action='store_true', help='use the real-input FT' )
+  parser.add_argument( '--pad',     choices=padModes, default=None, help='pad to a fast FT size, filling with this mode' )
+  parser.add_argument( '--jobs',    type=int, default=1, help='number of images to process in parallel' )
+  options = parser.parse_args( args )
+
+  if os.path.isdir( options.input ):
+    paths = [ os.path.join( options.input, filename ) for filename in os.listdir( options.input ) ]
+    inputDir = options.input
+  else:
+    paths = glob.glob( options.input )
+    inputDir = options.input
+    while glob.has_magic( inputDir ):
+      inputDir = os.path.dirname( inputDir )
 
-if len(sys.argv) > 1:
-  imageFilename = sys.argv[1]
-  imagePath = os.path.join( imageDir,  imageFilename  )
+  paths = sorted( path for path in paths if os.path.splitext( path )[1].lower() in imageExtensions )
 
-image  = loadImage(  imagePath  )
+  if not os.path.isdir( options.outputDir ):
+    os.makedirs( options.outputDir )
 
+  summaryPath = options.summary
+  if summaryPath is None:
+    summaryPath = os.path.join( options.outputDir, 'lines.csv' )
 
-# If commands exist on the command line (i.e. there are more than two
-# arguments), process each command, then exit.  Otherwise, go into
-# interactive mode.
+  if options.jobs > 1 and 'FFT_WORKERS' not in os.environ:
+    fftWorkers = 1 # the images are already processed in parallel
 
-if len(sys.argv) > 2:
+  outputPaths = {}
+  for path in paths:
+    outputPaths[path] = os.path.join( options.outputDir, os.path.relpath( path, inputDir or os.curdir ) )
+    if not os.path.isdir( os.path.dirname( outputPaths[path] ) ):
+      os.makedirs( os.path.dirname( outputPaths[path] ) )
 
-  outputMagnitudes = True
+  tasks = [ (path, outputPaths[path], options) for path in paths ]
 
-  # process commands
+  start = time.time()
 
-  cmds = sys.argv[2:]
+  if options.jobs > 1:
+    pool = multiprocessing.Pool( options.jobs )
+    results = pool.imap_unordered( batchProcess, tasks )
+  else:
+    results = (batchProcess( task ) for task in tasks)
 
-  while len(cmds) > 0:
-    cmd = cmds.pop(0)
-    if cmd == 'f':
-      forwardFT_all()
-    elif cmd == 'i':
-      inverseFT_all()
-    elif cmd == 'm':
-      outputMagnitudes = True
-    elif cmd == 'p':
-      outputMagnitudes = False
-    elif cmd == 'c':
-      resultImage, lines = compute()
-      print lines
-    elif cmd[0] == 'o': # image name follows in 'cmds'
-      filename = cmds.pop(0)
-      outputImage( resultImage, filename, False, False, True )
-    else:
-      print """command '%s' not understood.
+  # Write CSV rows as they arrive, so that an interrupted run keeps its results
+
+  summary = []
+  failed = 0
+
+  with open( summaryPath, 'wb' ) as f:
+
+    if not summaryPath.endswith( '.json' ):
+      writer = csv.writer( f )
+      writer.writerow( [ 'file', 'output', 'angle1', 'distance1', 'angle2', 'distance2', 'seconds', 'error' ] )
+
+    for path, lines, seconds, error in results:
+
+      if error is None:
+        print '%s: %.2f seconds' % (path, seconds)
+      else:
+        print '%s: failed (%s)' % (path, error)
+        failed += 1
+
+      if summaryPath.endswith( '.json' ):
+        summary.append( { 'file': path, 'output': outputPaths[path], 'lines': lines, 'seconds': seconds, 'error': error } )
+      else:
+        row = [ path, outputPaths[path] ]
+        for i in range(2):
+          if i < len(lines):
+            row += [ '%.3f' % lines[i][0], '%.3f' % lines[i][1] ]
+          else:
+            row += [ '', '' ]
+        writer.writerow( row + [ '%.3f' % seconds, error or '' ] )
+        f.flush()
+
+    if summaryPath.endswith( '.json' ):
+      json.dump( sorted( summary, key=lambda entry: entry['file'] ), f, indent=2 )
+
+  if options.jobs > 1:
+    pool.close()
+    pool.join()
+
+  elapsed = time.time() - start
+
+  print '%d images (%d failed) in %.2f seconds, %.2f seconds per image' % (len(tasks), failed, elapsed, elapsed / max( len(tasks), 1 ))
+  print 'grid lines written to %s' % summaryPath
+
+
+
+# Process one image in batch mode.  'task' is (input path, output
+# path, options).  Returns (input path, grid lines, seconds taken,
+# error message or None).
+
+def batchProcess( task ):
+
+  import time
+
+  global image, imageFT, gridImage, gridImageFT, resultImage, realFT, padFT, padMode
+
+  inputPath, outputPath, options = task
+
+  start = time.time()
+
+  realFT = options.real
+  padFT  = options.pad is not None
+  if padFT:
+    padMode = options.pad
+
+  stdout = sys.stdout
+  sys.stdout = open( os.devnull, 'w' ) # silence the progress messages of compute()
+
+  try:
+    image = loadImage( inputPath )
+    imageFT = gridImage = gridImageFT = None
+    resultImage, lines = compute()
+    outputImage( resultImage, outputPath, False, False, True )
+  except SystemExit: # loadImage() exits if the image can't be read
+    return inputPath, [], time.time() - start, 'could not load image'
+  except Exception, e:
+    return inputPath, [], time.time() - start, str(e) or e.__class__.__name__
+  finally:
+    sys.stdout.close()
+    sys.stdout = stdout
+
+  return inputPath, [ (float(angle), float(distance)) for angle, distance in lines ], time.time() - start, None
+
+
+
+if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+
+  if __name__ == '__main__': # not when imported by a worker process
+    batchMain( sys.argv[2:] )
+
+else:
+
+  # Load initial data
+  #
+  # The command line (stored in sys.argv) could have:
+  #
+  #     main.py {image filename}
+
+  if len(sys.argv) > 1:
+    imageFilename = sys.argv[1]
+    imagePath = os.path.join( imageDir,  imageFilename  )
+
+  image  = loadImage(  imagePath  )
+
+
+  # If commands exist on the command line (i.e. there are more than two
+  # arguments), process each command, then exit.  Otherwise, go into
+  # interactive mode.
+
+  if len(sys.argv) > 2:
+
+    outputMagnitudes = True
+
+    # process commands
+
+    cmds = sys.argv[2:]
+
+    while len(cmds) > 0:
+      cmd = cmds.pop(0)
+      if cmd == 'f':
+        forwardFT_all()
+      elif cmd == 'i':
+        inverseFT_all()
+      elif cmd == 'm':
+        outputMagnitudes = True
+      elif cmd == 'p':
+        outputMagnitudes = False
+      elif cmd == 'r':
+        setRealFT( True )
+      elif cmd == 'pad': # padding mode follows in 'cmds'
+        mode = cmds.pop(0)
+        if mode in padModes:
+          padMode = mode
+          setPadFT( True )
+        else:
+          print "padding mode '%s' not understood (use %s)" % (mode, ', '.join( padModes ))
+      elif cmd == 'b':
+        benchmarkFT()
+      elif cmd == 'c':
+        resultImage, lines = compute()
+        print lines
+      elif cmd[0] == 'o': # image name follows in 'cmds'
+        filename = cmds.pop(0)
+        outputImage( resultImage, filename, False, False, True )
+      else:
+        print """command '%s' not understood.
 command-line arguments:
   f - apply forward FT
   i - apply inverse FT
   o - output the image
   m - for output, use magnitudes (default)
-  p - for output, use phases""" % cmd
+  p - for output, use phases
+  r - use the real-input FT (before f or c)
+  pad {zero|reflect|mean} - pad to a fast FT size (before f or c)
+  b - benchmark the FT with and without padding""" % cmd
 
-else:
-      
-  # Run OpenGL
+  else:
+
+    try: # PyOpenGL
+      from OpenGL.GLUT import *
+      from OpenGL.GL import *
+      from OpenGL.GLU import *
+    except:
+      print 'Error: PyOpenGL has not been installed.'
+      sys.exit(0)
+
+    # File dialog
+
+    import Tkinter, tkFileDialog
+
+    root = Tkinter.Tk()
+    root.withdraw()
+
+    # Run OpenGL
 
-  glutInit()
-  glutInitDisplayMode( GLUT_DOUBLE | GLUT_RGB )
-  glutInitWindowSize( windowWidth, windowHeight )
-  glutInitWindowPosition( 50, 50 )
+    glutInit()
+    glutInitDisplayMode( GLUT_DOUBLE | GLUT_RGB )
+    glutInitWindowSize( windowWidth, windowHeight )
+    glutInitWindowPosition( 50, 50 )
 
-  glutCreateWindow( 'imaging' )
+    glutCreateWindow( 'imaging' )
 
-  glutDisplayFunc( display )
-  glutKeyboardFunc( keyboard )
-  glutSpecialFunc( special )
-  glutReshapeFunc( reshape )
-  glutMouseFunc( mouse )
-  glutMotionFunc( mouseMotion )
+    glutDisplayFunc( display )
+    glutKeyboardFunc( keyboard )
+    glutSpecialFunc( special )
+    glutReshapeFunc( reshape )
+    glutMouseFunc( mouse )
+    glutMotionFunc( mouseMotion )
 
-  glDisable( GL_DEPTH_TEST )
+    glDisable( GL_DEPTH_TEST )
 
-  glutMainLoop()
+    glutMainLoop()
@@ -30,7 +30,8 @@ from OpenGL.GLU import *
 windowWidth  = 1000    # window dimensions (not image dimensions)
 windowHeight =  800
 
-texID = None           # for OpenGL
+textures = {}          # for OpenGL: image index -> [texture ID, shown array, key, shape]
+displayGeneration = 0  # incremented when the images change in place
 
 zoom = 1.0             # amount by which to zoom images
 translate = (0.0,0.0)  # amount by which to translate images
@@ -45,7 +46,7 @@ imagePath     = os.path.join( imageDir, imageFilename )
 image          = None    # the image as a 2D np.array
 smoothImage    = None    # the smoothed image
 gradientMags   = None    # the image with gradient magnitudes (in 0...255)
-gradientDirs   = None    # array of gradient directions in [0,7] with direction i = i*45 degrees.
+gradientDirs   = None    # array of gradient directions (uint8) in [0,7] with direction i = i*45 degrees.
 maximaImage    = None    # gradient magnitues with non-maxima set to 0
 thresholdImage = None    # thresholded pixels (= 255 or 128 or 0)
 edgeImage      = None    # final edges pixels (= 255 or 0)
@@ -59,6 +60,14 @@ normalizeImage = True # scale image so that its pixels are in the range [0,255]
 upperThreshold = 25
 lowerThreshold = 5
 
+smoothSigma  = None    # if set, smooth with a Gaussian of this standard deviation instead of the 5x5 filter
+smoothBorder = 'edge'  # how pixels beyond the border are filled when smoothing (a numpy.pad mode)
+smoothBorders = [ 'edge', 'reflect', 'symmetric', 'wrap', 'constant' ]
+
+productionMode    = False  # stream bands of rows through the stages instead of computing each full image in turn
+keepIntermediates = True   # in production mode, also fill the intermediate images (for viewing with + and -)
+bandRows          = 256    # rows computed per band in production mode
+
 
 # Apply Canny edge detection
 #
@@ -68,6 +77,9 @@ def compute():
 
   global image, smoothImage, gradientMags, gradientDirs, maximaImage, thresholdImage, edgeImage, currentImage
 
+  if productionMode:
+    return computeInBands()
+
   height = image.shape[0]
   width  = image.shape[1]
 
@@ -83,7 +95,7 @@ def compute():
     gradientMags = np.zeros( (height,width), dtype=np.float_ )
 
   if gradientDirs is None:
-    gradientDirs = np.zeros( (height,width), dtype=np.float_ )
+    gradientDirs = np.zeros( (height,width), dtype=np.uint8 )
 
   findGradients( smoothImage, gradientMags, gradientDirs )
 
@@ -119,6 +131,104 @@ def compute():
   return edgePixels
 
 
+# Apply Canny edge detection in production mode
+#
+# The image is processed in bands of 'bandRows' rows.  Each band is
+# smoothed, differentiated and non-maxima suppressed with a halo of
+# extra rows above and below (the smoothing radius, plus 1 for the
+# gradients and 1 for the suppression), so that the thresholds of its
+# rows are exactly those of compute() on the full image.  Only band-
+# sized buffers are needed, and the thresholded and edge images are
+# uint8.  The intermediate images are filled only if
+# 'keepIntermediates' is set, and are None otherwise.
+#
+# Edge tracking connects pixels across bands, so it is done on the
+# whole thresholded image at the end.
+#
+# Returns list of edge pixels
+
+def computeInBands():
+
+  global smoothImage, gradientMags, gradientDirs, maximaImage, thresholdImage, edgeImage, currentImage
+
+  height = image.shape[0]
+  width  = image.shape[1]
+
+  halo = smoothKernel().shape[0] / 2 + 2
+
+  rows = bandRows
+  if smoothBorder == 'wrap': # the border wraps around to the other side of the image, so use one band
+    rows = height
+
+  if thresholdImage is None or thresholdImage.shape != (height,width) or thresholdImage.dtype != np.uint8:
+    thresholdImage = np.zeros( (height,width), dtype=np.uint8 )
+
+  if edgeImage is None or edgeImage.shape != (height,width) or edgeImage.dtype != np.uint8:
+    edgeImage = np.zeros( (height,width), dtype=np.uint8 )
+
+  if keepIntermediates:
+    if smoothImage is None:
+      smoothImage = np.zeros( (height,width), dtype=np.float_ )
+    if gradientMags is None:
+      gradientMags = np.zeros( (height,width), dtype=np.float_ )
+    if gradientDirs is None:
+      gradientDirs = np.zeros( (height,width), dtype=np.uint8 )
+    if maximaImage is None:
+      maximaImage = np.zeros( (height,width), dtype=np.float_ )
+  else:
+    smoothImage  = None
+    gradientMags = None
+    gradientDirs = None
+    maximaImage  = None
+
+  # buffers for the largest band, including its halo
+
+  bandHeight = min( rows + 2*halo, height )
+
+  bandSmooth = np.empty( (bandHeight,width), np.float_ )
+  bandMags   = np.empty( (bandHeight,width), np.float_ )
+  bandDirs   = np.empty( (bandHeight,width), np.uint8 )
+  bandMaxima = np.empty( (bandHeight,width), np.float_ )
+
+  print 'smoothing, finding gradients, suppressing non-maxima and double thresholding in bands of %d rows' % rows
+
+  for start in range( 0, height, rows ):
+
+    stop = min( start + rows, height )
+
+    first = max( start - halo, 0 )
+    last  = min( stop  + halo, height )
+
+    n = last - first
+
+    smooth( image[first:last], bandSmooth[:n] )
+    findGradients( bandSmooth[:n], bandMags[:n], bandDirs[:n] )
+    suppressNonMaxima( bandMags[:n], bandDirs[:n], bandMaxima[:n] )
+
+    core = slice( start - first, stop - first ) # rows of the band without its halo
+
+    doubleThreshold( bandMaxima[core], thresholdImage[start:stop] )
+
+    if keepIntermediates:
+      smoothImage[start:stop]  = bandSmooth[core]
+      gradientMags[start:stop] = bandMags[core]
+      gradientDirs[start:stop] = bandDirs[core]
+      maximaImage[start:stop]  = bandMaxima[core]
+
+  print 'edge tracking'
+
+  trackEdges( thresholdImage, edgeImage )
+
+  # extract edge pixels
+
+  edgePixels = list( np.transpose( np.nonzero( edgeImage ) ) )
+
+  currentImage = len(imageNames)-1
+
+  return edgePixels
+
+
+
 # Smooth image
 #
 # Apply the 5x5 filter (below) to 'image' and store the result in
@@ -131,13 +241,105 @@ def smooth( image, smoothedImage ):
   height = image.shape[0]
   width  = image.shape[1]
   
-  kernel = (1/273.0) * np.array( [[1,  4,  7,  4, 1],
+  kernel = smoothKernel()
+
+  convolve( image, kernel, smoothedImage, smoothBorder )
+
+
+
+# Return the smoothing kernel: the 5x5 filter or, if 'smoothSigma' is
+# set, a Gaussian with that standard deviation (which must be > 0) and
+# a radius of 3*sigma.
+
+def smoothKernel():
+
+  if smoothSigma is None:
+    return (1/273.0) * np.array( [[1,  4,  7,  4, 1],
                                   [4, 16, 26, 16, 4],
                                   [7, 26, 41, 26, 7],
                                   [4, 16, 26, 16, 4],
                                   [1,  4,  7,  4, 1]] )
 
-  # YOUR CODE HERE
+  radius = int( math.ceil( 3 * smoothSigma ) )
+
+  x = np.arange( -radius, radius+1 )
+  g = np.exp( -x*x / (2.0 * smoothSigma * smoothSigma) )
+  g /= g.sum()
+
+  return np.outer( g, g )
+
+
+
+# Convolve 'image' with 'kernel' (of odd dimensions) and store the
+# result in 'result', which has the image's shape.  Pixels beyond the
+# border are filled according to 'border', a numpy.pad mode.
+#
+# A separable kernel (i.e. of rank 1, such as a Gaussian) is the outer
+# product of a column and a row, and is applied as two 1D passes, with
+# 2r+1 instead of (2r+1)^2 multiplications per pixel for a kernel of
+# radius r.  Other kernels (such as the 5x5 filter, which is close to
+# but not quite separable) are applied directly.
+
+def convolve( image, kernel, result, border = 'edge' ):
+
+  kernel = np.asarray( kernel, np.float_ )[::-1,::-1] # flipped, so that convolution is a weighted sum of shifted images
+
+  u, s, vt = np.linalg.svd( kernel )
+
+  if s.size < 2 or s[1] <= 1e-10 * s[0]:
+
+    column = u[:,0] * math.sqrt( s[0] )
+    row    = vt[0]  * math.sqrt( s[0] )
+
+    temp = np.empty( result.shape, np.float_ )
+
+    convolveAxis( image, column, 0, temp, border )
+    convolveAxis( temp,  row,    1, result, border )
+
+  else:
+
+    rh = kernel.shape[0] / 2
+    rw = kernel.shape[1] / 2
+
+    height = image.shape[0]
+    width  = image.shape[1]
+
+    padded = np.pad( image, ((rh,rh),(rw,rw)), border )
+    term   = np.empty( result.shape, np.float_ )
+
+    result.fill( 0 )
+
+    for y in range( kernel.shape[0] ):
+      for x in range( kernel.shape[1] ):
+        if kernel[y,x] != 0:
+          np.multiply( padded[y:y+height,x:x+width], kernel[y,x], out=term )
+          result += term
+
+
+
+# Apply the 1D 'weights' (already flipped) along 'axis' (0 = columns,
+# 1 = rows) of 'image', storing the weighted sums in 'result'.
+
+def convolveAxis( image, weights, axis, result, border ):
+
+  r = weights.size / 2
+  n = image.shape[axis]
+
+  if axis == 0:
+    padded = np.pad( image, ((r,r),(0,0)), border )
+  else:
+    padded = np.pad( image, ((0,0),(r,r)), border )
+
+  term = np.empty( result.shape, np.float_ )
+
+  result.fill( 0 )
+
+  for i in range( weights.size ):
+    if axis == 0:
+      np.multiply( padded[i:i+n], weights[i], out=term )
+    else:
+      np.multiply( padded[:,i:i+n], weights[i], out=term )
+    result += term
 
       
 # Compute the image's gradient magnitudes and directions
@@ -156,26 +358,49 @@ def findGradients( image, gradientMags, gradientDirs ):
   height = image.shape[0]
   width  = image.shape[1]
 
-  # YOUR CODE HERE
-  '''
-  Dx = np.array( [[1, 0, -1],
-                  [2, 0, -2],
-                  [1, 0, -1]] )
-				  
-  Dy = np.array( [[ 1,  2,  1],
-                  [ 0,  0,  0],
-                  [-1, -2, -1]] )
-				  
-  Convolve Dx and Dy with Image to get Gx and Gy
-  (see part 1 for steps)
-  
-  At each pixel, compute gradientMags
-  gradientMags[i] = sqrt(Gx[i]^2 + Gy[i]^2)
-  
-  At each pixel, compute gradientDirs ***0-7 slices in one line***
-  gradientDirs[i] = (nearest int(arctan2(Gy[i]/Gx[i])/(pi/4)))modulo 8
-  
-  '''
+  # Dx = [[1, 0, -1],      Dy = [[ 1,  2,  1],
+  #       [2, 0, -2],            [ 0,  0,  0],
+  #       [1, 0, -1]]            [-1, -2, -1]]
+  #
+  # Both kernels are separable, and share shifted views of the image
+  # (with its border pixels repeated), so Gx and Gy are computed
+  # together without 3x3 convolutions:
+  #
+  #   Gx = [1,2,1] down the columns of the horizontal differences D
+  #   Gy = vertical differences of S = [1,2,1] along the rows
+  #
+  # Rows increase upward, so Gy > 0 points up (direction 2).
+
+  padded = np.pad( image, 1, 'edge' )
+
+  left   = padded[:,:-2]
+  centre = padded[:,1:-1]
+  right  = padded[:,2:]
+
+  gx = np.empty( (height,width), np.float_ )
+  gy = np.empty( (height,width), np.float_ )
+
+  rows = np.subtract( right, left ) # D
+
+  np.add( rows[:-2], rows[2:], out=gx )
+  gx += rows[1:-1]
+  gx += rows[1:-1]
+
+  np.add( left, right, out=rows ) # S, reusing the buffer of D
+  rows += centre
+  rows += centre
+
+  np.subtract( rows[2:], rows[:-2], out=gy )
+
+  # Magnitudes, then directions rounded to the nearest multiple of 45 degrees
+
+  np.hypot( gx, gy, out=gradientMags )
+
+  angles = np.arctan2( gy, gx, out=gx )
+  angles /= math.pi/4
+  np.rint( angles, out=angles )
+
+  gradientDirs[...] = angles % 8
 
 # Suppress the non-maxima in the gradient directions
 #
@@ -193,7 +418,23 @@ def suppressNonMaxima( magnitude, gradientDirs, maximaImage ):
   height = magnitude.shape[0]
   width  = magnitude.shape[1]
 
-  # YOUR CODE HERE  
+  # Direction i and i+4 have opposite offsets, so a pixel is compared
+  # with its neighbours at offset[i % 4] and -offset[i % 4].  Each
+  # neighbour is a shifted view of the (zero-padded) magnitudes, and
+  # np.choose selects, for every pixel, the view for its direction.
+  # Offsets are (x,y) = (column,row).
+
+  padded = np.pad( magnitude, 1, 'constant' )
+
+  ahead  = [ padded[1+dy:1+dy+height, 1+dx:1+dx+width] for (dx,dy) in offset[:4] ]
+  behind = [ padded[1-dy:1-dy+height, 1-dx:1-dx+width] for (dx,dy) in offset[:4] ]
+
+  axis = np.asarray( gradientDirs, np.uint8 ) % 4
+
+  isMax = magnitude >= np.choose( axis, ahead )
+  isMax &= magnitude >= np.choose( axis, behind )
+
+  np.multiply( magnitude, isMax, out=maximaImage )
 
 
 
@@ -209,7 +450,9 @@ def doubleThreshold( maximaImage, thresholdImage ):
   height = maximaImage.shape[0]
   width  = maximaImage.shape[1]
 
-  # YOUR CODE HERE  
+  thresholdImage.fill( 128 )
+  thresholdImage[ maximaImage < lowerThreshold ] = 0
+  thresholdImage[ maximaImage > upperThreshold ] = 255
 
 
 
@@ -235,7 +478,121 @@ def trackEdges( thresholdImage, edgePixels ):
 
   offsets = [ (1,0), (1,1), (0,1), (-1,1), (-1,0), (-1,-1), (0,-1), (1,-1) ]
 
-  # YOUR CODE HERE
+  # The pixels are labelled (0, weak = 128, strong = 255) in a copy of
+  # the image with a border of 0s, so that neighbours never fall
+  # outside.  Pixels are referred to by their index in the flattened
+  # copy, where offset (dx,dy) is a step of dy*(width+2) + dx.
+
+  state = np.zeros( (height+2,width+2), np.uint8 )
+  state[1:-1,1:-1] = thresholdImage
+
+  flat  = state.ravel()
+  steps = [ dy*(width+2) + dx for (dx,dy) in offsets ]
+
+  # The strong pixels, and each weak pixel when it becomes strong,
+  # are added to a preallocated queue, which can't hold more than all
+  # weak and strong pixels.  Each round takes all pixels added in the
+  # previous round and, for one offset at a time, makes their weak
+  # neighbours strong.  Since these are marked strong before the next
+  # offset, no pixel is added twice, and the total work is linear in
+  # the number of pixels.
+
+  queue = np.empty( np.count_nonzero( flat ), np.intp )
+
+  strong = np.flatnonzero( flat == 255 )
+  queue[:strong.size] = strong
+
+  head = 0
+  tail = strong.size
+
+  while head < tail:
+
+    added = queue[head:tail]
+    head  = tail
+
+    for step in steps:
+      neighbours = added + step
+      neighbours = neighbours[ flat[neighbours] == 128 ]
+      flat[neighbours] = 255
+      queue[tail:tail+neighbours.size] = neighbours
+      tail += neighbours.size
+
+  edgePixels[ state[1:-1,1:-1] == 255 ] = 255
+
+
+
+# Attach weak pixels to strong pixels, as trackEdges() does, with a
+# Python list of strong pixels to visit.  This is the straightforward
+# worklist version, kept as a reference for trackEdges().
+
+def trackEdgesWorklist( thresholdImage, edgePixels ):
+
+  height = thresholdImage.shape[0]
+  width  = thresholdImage.shape[1]
+  
+  edgePixels.fill(0)
+
+  offsets = [ (1,0), (1,1), (0,1), (-1,1), (-1,0), (-1,-1), (0,-1), (1,-1) ]
+
+  weak = (thresholdImage == 128).tolist()
+
+  worklist = [ (x,y) for (y,x) in np.transpose( np.nonzero( thresholdImage == 255 ) ).tolist() ]
+
+  for (x,y) in worklist:
+    edgePixels[y,x] = 255
+
+  while worklist:
+    x, y = worklist.pop()
+    for (dx,dy) in offsets:
+      nx = x+dx
+      ny = y+dy
+      if 0 <= nx < width and 0 <= ny < height and weak[ny][nx]:
+        weak[ny][nx] = False
+        edgePixels[ny,nx] = 255
+        worklist.append( (nx,ny) )
+
+
+
+# Compare the speeds of trackEdges() and trackEdgesWorklist() on
+# 'lanes.png' and 'wiki.png' scaled up to 8K (7680 pixels wide), and
+# check that they find the same edges.
+
+def benchmarkTracking():
+
+  import time
+
+  for filename in [ 'lanes.png', 'wiki.png' ]:
+
+    img = Image.open( os.path.join( imageDir, filename ) ).convert( 'L' )
+    img = img.resize( (7680, int( round( img.size[1] * 7680.0 / img.size[0] ) )), Image.BICUBIC ).transpose( Image.FLIP_TOP_BOTTOM )
+
+    pixels = np.asarray( img, np.float_ )
+    shape  = pixels.shape
+
+    smoothed = np.empty( shape, np.float_ )
+    mags     = np.empty( shape, np.float_ )
+    dirs     = np.empty( shape, np.uint8 )
+    maxima   = np.empty( shape, np.float_ )
+    labels   = np.empty( shape, np.float_ )
+
+    smooth( pixels, smoothed )
+    findGradients( smoothed, mags, dirs )
+    suppressNonMaxima( mags, dirs, maxima )
+    doubleThreshold( maxima, labels )
+
+    print '%s at %dx%d: %d strong and %d weak pixels' % (filename, shape[1], shape[0], np.count_nonzero( labels == 255 ), np.count_nonzero( labels == 128 ))
+
+    edges = []
+    times = []
+
+    for track in [ trackEdges, trackEdgesWorklist ]:
+      result = np.empty( shape, np.float_ )
+      start = time.time()
+      track( labels, result )
+      times.append( time.time() - start )
+      edges.append( result )
+
+    print '  queue %.2fs   worklist %.2fs   speedup %.1fx   same edges: %s' % (times[0], times[1], times[1] / times[0], np.array_equal( edges[0], edges[1] ))
 
 
     
@@ -267,20 +624,9 @@ def display():
 
   # Set up texturing
 
-  global texID
-  
-  if texID == None:
-    texID = glGenTextures(1)
-
   glPixelStorei( GL_UNPACK_ALIGNMENT, 1 )
-  glBindTexture( GL_TEXTURE_2D, texID )
 
   glTexEnvf(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
-  glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
-  glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
-  glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-  glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-  glTexParameterfv(GL_TEXTURE_2D, GL_TEXTURE_BORDER_COLOR, [1,0,0,1] );
 
   # Images to draw, in rows and columns
 
@@ -301,28 +647,9 @@ def display():
         height = scale * img.shape[0]
         width  = scale * img.shape[1]
 
-        # Get pixels and draw
-
-        show = np.real(img)
-
-        # Normalize image so all pixels are in [0,255].  This is useful when debugging because small details are more visible.
-        
-        if normalizeImage:
-          min = np.min(show)
-          max = np.max(show)
-          if min == max:
-            max = min+1
-          show = (show - min) / (max-min) * 255
-
-        # Put the image into a texture, then draw it
-
-        imgData = np.array( np.ravel(show), np.uint8 ).tostring()
+        # Get the texture, which is only filled again if the image or the normalization has changed
 
-        # with open( 'out.pgm', 'wb' ) as f:
-        #   f.write( 'P5\n%d %d\n255\n' % (img.shape[1], img.shape[0]) )
-        #   f.write( imgData )
-
-        glTexImage2D( GL_TEXTURE_2D, 0, GL_INTENSITY, img.shape[1], img.shape[0], 0, GL_LUMINANCE, GL_UNSIGNED_BYTE, imgData )
+        bindTexture( currentImage, img, normalizeImage, lambda: displayPixels( img ) )
 
         # Include zoom and translate
 
@@ -365,6 +692,73 @@ def display():
 
   
 
+# Return the pixels in [0,255] to show for the image 'img'
+
+def displayPixels( img ):
+
+  show = np.real(img)
+
+  # Normalize image so all pixels are in [0,255].  This is useful when debugging because small details are more visible.
+
+  if normalizeImage:
+    min = np.min(show)
+    max = np.max(show)
+    if min == max:
+      max = min+1
+    show = (show - min) / (max-min) * 255
+
+  return np.array( show, np.uint8 )
+
+
+
+# Bind the texture of image 'index' (in imageNames), which shows the
+# array 'source' in display 'mode'.  The pixels are only computed (by
+# calling 'getPixels') and uploaded when the array, the mode or
+# 'displayGeneration' has changed since the last upload, so that
+# redraws for panning and zooming just draw a quad.
+#
+# Returns the shape of the texture.
+
+def bindTexture( index, source, mode, getPixels ):
+
+  entry = textures.get( index )
+
+  if entry is None:
+    entry = [ glGenTextures(1), None, None, None ]
+    textures[index] = entry
+
+    glBindTexture( GL_TEXTURE_2D, entry[0] )
+
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameterfv(GL_TEXTURE_2D, GL_TEXTURE_BORDER_COLOR, [1,0,0,1] );
+  else:
+    glBindTexture( GL_TEXTURE_2D, entry[0] )
+
+  key = (mode, displayGeneration)
+
+  if entry[1] is not source or entry[2] != key:
+    imgData = getPixels()
+    glTexImage2D( GL_TEXTURE_2D, 0, GL_INTENSITY, imgData.shape[1], imgData.shape[0], 0, GL_LUMINANCE, GL_UNSIGNED_BYTE, imgData.tostring() )
+    entry[1:] = [ source, key, imgData.shape ]
+
+  return entry[3]
+
+
+
+# Note that the images have changed in place (e.g. in compute()), so
+# that their textures are uploaded again.
+
+def imagesChanged():
+
+  global displayGeneration
+
+  displayGeneration += 1
+
+
+
 # Get information about how to place the images.
 #
 # toDraw                       2D array of images 
@@ -425,7 +819,7 @@ def getImagesInfo():
 
 def keyboard( key, x, y ):
 
-  global image, imageFilename, smoothImage, gradientMags, gradientDirs, maximaImage, thresholdImage, edgeImage, zoom, translate, currentImage, normalizeImage
+  global image, imageFilename, smoothImage, gradientMags, gradientDirs, maximaImage, thresholdImage, edgeImage, zoom, translate, currentImage, normalizeImage, productionMode
 
   if key == '\033': # ESC = exit
     sys.exit(0)
@@ -446,11 +840,19 @@ def keyboard( key, x, y ):
         maximaImage    = None
         thresholdImage = None
         edgeImage      = None
+        imagesChanged()
 
   elif key == 'z':
     zoom = 1
     translate = (0,0)
 
+  elif key == 'p':
+    productionMode = not productionMode
+    if productionMode:
+      print 'production mode (banded)'
+    else:
+      print 'full-image mode'
+
   elif key == 'n':
     normalizeImage = not normalizeImage
     if normalizeImage:
@@ -460,6 +862,7 @@ def keyboard( key, x, y ):
 
   elif key == 'c': # compute
     edgePixels = compute()
+    imagesChanged()
     # print 'Edge pixels:'
     # for px in edgePixels:
     #   print ' %.1f,%.1f' % (px[0],px[1])
@@ -473,6 +876,7 @@ def keyboard( key, x, y ):
   else:
     print '''keys:
            c  compute the solution
+           p  toggle production mode (compute in bands of rows)
            i  load image
            z  reset the translation and zoom
            +  next image
@@ -707,15 +1111,43 @@ if len(sys.argv) > 2:
     elif cmd[0] == 'o': # image name follows in 'cmds'
       filename = cmds.pop(0)
       allImages = [ image, smoothImage, gradientMags, gradientDirs, maximaImage, thresholdImage, edgeImage ]
-      outputImage( allImages[currentImage], filename )
+      if allImages[currentImage] is None:
+        print "no %s to output (intermediate images aren't kept in production mode)" % imageNames[currentImage]
+      else:
+        outputImage( allImages[currentImage], filename )
+    elif cmd == 'p':
+      productionMode    = True
+      keepIntermediates = False # nothing is viewed
     elif cmd[0] in ['0','1','2','3','4','5','6']:
       currentImage = int(cmd[0]) - int('0')
+    elif cmd == 'b':
+      benchmarkTracking()
+    elif cmd == 's': # standard deviation follows in 'cmds'
+      value = cmds.pop(0)
+      try:
+        sigma = float( value )
+      except ValueError:
+        sigma = 0
+      if sigma > 0:
+        smoothSigma = sigma
+      else:
+        print "sigma '%s' not understood (use a number > 0)" % value
+    elif cmd == 'border': # border mode follows in 'cmds'
+      mode = cmds.pop(0)
+      if mode in smoothBorders:
+        smoothBorder = mode
+      else:
+        print "border mode '%s' not understood (use %s)" % (mode, ', '.join( smoothBorders ))
     else:
       print """command '%s' not understood.
 command-line arguments:
   c   - apply Canny 
   0-6 - set current image
   o   - output current image
+  s {sigma} - smooth with a Gaussian of this standard deviation (before c)
+  border {edge|reflect|symmetric|wrap|constant} - fill beyond the border when smoothing (before c)
+  b   - benchmark edge tracking against the worklist version on 8K images
+  p   - production mode: compute in bands of rows, without keeping intermediate images (before c)
 """ % cmd
 
 else: